@@ -0,0 +1,84 @@
+from __future__ import annotations
+import argparse
+from pathlib import Path
+import duckdb
+import pyarrow as pa
+import pyarrow.ipc as ipc
+from session import Session
+from views import BUSINESS_VIEWS
+
+# Arrow export of the warehouse for downstream jobs.
+# Results go from DuckDB to Arrow without passing through pandas: as a
+# table, as a stream of record batches, or as files (one per business view)
+# in Arrow IPC format, which readers memory-map without copying, or Parquet.
+BASE_DIR = Path(__file__).resolve().parents[1]
+DB_PATH = BASE_DIR / "data" / "gold" / "football_dw.duckdb"
+EXPORT_DIR = BASE_DIR / "data" / "exports"
+
+FORMATS = ("arrow", "parquet")
+BATCH_ROWS = 100_000
+
+def fetch_arrow(con: duckdb.DuckDBPyConnection, sql: str, params: object = None) -> pa.Table:
+    return con.execute(sql, params).to_arrow_table()
+
+# Stream a result in record batches of at most batch_rows rows, so exports
+# of large results never hold the whole result in memory.
+def record_batch_reader(
+    con: duckdb.DuckDBPyConnection,
+    sql: str,
+    params: object = None,
+    batch_rows: int = BATCH_ROWS,
+) -> pa.RecordBatchReader:
+    return con.execute(sql, params).to_arrow_reader(batch_rows)
+
+# Write a batch stream to an Arrow IPC file (written under a temporary name
+# and renamed, so readers never map a half-written file). Returns the rows written.
+def write_ipc(reader: pa.RecordBatchReader, path: Path) -> int:
+    tmp = path.with_name(path.name + ".tmp")
+    rows = 0
+    with pa.OSFile(str(tmp), "wb") as sink, ipc.new_file(sink, reader.schema) as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    tmp.replace(path)
+    return rows
+
+# Memory-map an Arrow IPC file: the returned table references the mapped
+# file instead of copying its buffers.
+def read_ipc(path: Path) -> pa.Table:
+    with pa.memory_map(str(path), "r") as source:
+        return ipc.open_file(source).read_all()
+
+# Export every business view to out_dir as <view>.arrow or <view>.parquet.
+# Parquet files are written by DuckDB's COPY, without an Arrow round trip.
+# Returns the path of each exported view.
+def export_views(session: Session, out_dir: Path = EXPORT_DIR, fmt: str = "arrow") -> dict[str, Path]:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt} (expected one of {FORMATS})")
+    out_dir.mkdir(parents=True, exist_ok=True)
+    con = session.con
+
+    paths = {}
+    for view in BUSINESS_VIEWS:
+        path = out_dir / f"{view.name}.{fmt}"
+        if fmt == "parquet":
+            tmp = path.with_name(path.name + ".tmp")
+            con.execute(
+                f"COPY (SELECT * FROM {view.name}) TO '{tmp.as_posix()}' (FORMAT parquet, COMPRESSION zstd)"
+            )
+            tmp.replace(path)
+        else:
+            write_ipc(record_batch_reader(con, f"SELECT * FROM {view.name}"), path)
+        paths[view.name] = path
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the business views as Arrow IPC or Parquet files")
+    parser.add_argument("--format", choices=FORMATS, default="arrow")
+    parser.add_argument("--out", type=Path, default=EXPORT_DIR, help="output directory")
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    args = parser.parse_args()
+
+    with Session(args.db, read_only=True) as session:
+        for name, path in export_views(session, args.out, args.format).items():
+            print(f"{name} -> {path}")
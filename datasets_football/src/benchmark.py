@@ -0,0 +1,147 @@
+from __future__ import annotations
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+import duckdb
+import pandas as pd
+from extract import extract_matches, extract_player_stats
+from transform import transform
+from data_quality import data_quality
+from load import load_staging
+from transform_sql import load_staging_sql
+from silver import write_silver
+from dw import build_dw
+from kpis import build_kpis
+from cube import build_cube
+from views import build_business_views
+from session import Session
+from metrics import peak_rss_mb
+from synthetic import generate
+
+# Scaling benchmark: runs the stages of a full pipeline run on synthetic
+# bronze files of increasing size and appends one JSON line per stage and
+# scale to the results file (wall time, rows, rows/s, peak RSS).
+BASE_DIR = Path(__file__).resolve().parents[1]
+RESULTS = BASE_DIR / "data" / "benchmarks" / "results.jsonl"
+SCALES = (10, 100, 1000)
+
+# Run the stages of pipeline.run_full on the given files in work_dir and
+# return one measurement per stage. Peak RSS is cumulative: the peak of the
+# process up to the end of the stage.
+def bench_stages(
+    matches_csv: Path,
+    stats_csv: Path,
+    work_dir: Path,
+    engine: str = "pandas",
+    compact: bool = False,
+) -> list[dict]:
+    results = []
+
+    def stage(name: str, rows: int, fn):
+        start = time.perf_counter()
+        out = fn()
+        seconds = time.perf_counter() - start
+        results.append({
+            "stage": name,
+            "rows": rows,
+            "seconds": round(seconds, 6),
+            "rows_per_s": round(rows / seconds, 1) if seconds else None,
+            "process_peak_rss_mb": peak_rss_mb(),
+        })
+        return out
+
+    # Bronze rows (matches + player stats) processed by the silver stages
+    rows = _count_lines(matches_csv) + _count_lines(stats_csv)
+
+    with Session(work_dir / "bench.duckdb") as session:
+        if engine == "duckdb":
+            stage("load_staging_sql", rows, lambda: load_staging_sql([matches_csv], [stats_csv], session))
+        else:
+            matches_raw, stats_raw = stage("extract", rows, lambda: (
+                extract_matches(matches_csv), extract_player_stats(stats_csv)
+            ))
+            matches, stats = stage("transform", rows, lambda: transform(matches_raw, stats_raw, compact))
+            stage("data_quality", rows, lambda: data_quality(matches, stats))
+            stage("load_staging", rows, lambda: load_staging(matches, stats, session))
+
+        stage("write_silver", rows, lambda: write_silver(session, work_dir / "silver"))
+        stage("build_dw", rows, lambda: build_dw(session))
+        fact_rows = session.con.execute(
+            "SELECT (SELECT COUNT(*) FROM fact_match) + (SELECT COUNT(*) FROM fact_player_match)"
+        ).fetchone()[0]
+        stage("build_kpis", fact_rows, lambda: build_kpis(session))
+        stage("build_cube", fact_rows, lambda: build_cube(session))
+        stage("build_business_views", fact_rows, lambda: build_business_views(session))
+
+    return results
+
+def _count_lines(path: Path) -> int:
+    with open(path, "rb") as f:
+        # Data rows: newlines minus the header
+        return sum(block.count(b"\n") for block in iter(lambda: f.read(1 << 20), b"")) - 1
+
+# One scale, in the current process: generate the files and time the stages.
+def run_scale(scale: float, engine: str = "pandas", seed: int = 0, compact: bool = False) -> list[dict]:
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+        matches_csv, stats_csv = generate(work_dir / "bronze", scale, seed)
+        return bench_stages(matches_csv, stats_csv, work_dir, engine, compact)
+
+# Every scale runs in a fresh interpreter so that peak RSS and DuckDB's
+# buffer cache of one scale do not leak into the next.
+def main(
+    scales: list[float] = list(SCALES),
+    engine: str = "pandas",
+    seed: int = 0,
+    results_path: Path = RESULTS,
+    compact: bool = False,
+) -> list[dict]:
+    run_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    records = []
+    for scale in scales:
+        out = subprocess.run(
+            [sys.executable, __file__, "--worker", "--scale", str(scale),
+             "--engine", engine, "--seed", str(seed)] + (["--compact-dtypes"] if compact else []),
+            check=True, capture_output=True, text=True,
+        ).stdout
+        for line in out.splitlines():
+            records.append({
+                "run_at": run_at,
+                "scale": scale,
+                "engine": engine,
+                "compact_dtypes": compact,
+                **json.loads(line),
+                "pandas": pd.__version__,
+                "duckdb": duckdb.__version__,
+            })
+
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(results_path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+    print(pd.DataFrame(records)[["scale", "stage", "rows", "seconds", "rows_per_s", "process_peak_rss_mb"]].to_string(index=False))
+    print(f"\nResults appended to {results_path}")
+    return records
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline scaling benchmark")
+    parser.add_argument("--scale", type=float, action="append", dest="scales",
+                        help=f"multiple of the sample dataset size (repeatable, default {SCALES})")
+    parser.add_argument("--engine", choices=("pandas", "duckdb"), default="pandas")
+    parser.add_argument("--compact-dtypes", action="store_true", help="pandas engine: compact silver dtypes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--results", type=Path, default=RESULTS, help="JSON lines file to append to")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        for record in run_scale(args.scales[0], args.engine, args.seed, args.compact_dtypes):
+            print(json.dumps(record))
+    else:
+        main(args.scales or list(SCALES), args.engine, args.seed, args.results, args.compact_dtypes)
@@ -0,0 +1,107 @@
+from __future__ import annotations
+import glob
+import hashlib
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+from incremental import file_fingerprints
+
+# Multi-file bronze layer.
+# A bronze source is a CSV file, a directory or a glob pattern, resolved to
+# plain and gzip-compressed CSV files (e.g. one feed file per league and
+# matchday). Every staged row carries the name of the file it came from
+# (source_file) and the time the run ingested it (ingested_at).
+BRONZE_SUFFIXES = (".csv", ".csv.gz")
+
+@dataclass(frozen=True)
+class Bronze:
+    matches: tuple[Path, ...]
+    stats: tuple[Path, ...]
+    # Processes parsing the files of a source in parallel (1: in this process)
+    workers: int = 1
+    # Fingerprint of every file (see incremental.file_fingerprints), taken
+    # once per run by fingerprint_bronze
+    matches_files: dict[str, str] | None = None
+    stats_files: dict[str, str] | None = None
+
+def resolve_bronze(matches: str | Path, stats: str | Path, workers: int = 1) -> Bronze:
+    return Bronze(resolve_files(matches), resolve_files(stats), workers)
+
+# The bronze sources with their file fingerprints. Every file is hashed once
+# per run: the stage cache key and the watermarks both use these.
+def fingerprint_bronze(bronze: Bronze) -> Bronze:
+    if bronze.matches_files is not None and bronze.stats_files is not None:
+        return bronze
+    return replace(
+        bronze,
+        matches_files=file_fingerprints(bronze.matches),
+        stats_files=file_fingerprints(bronze.stats),
+    )
+
+# Files of a bronze source, sorted by path so every run reads them in the
+# same order.
+def resolve_files(spec: str | Path) -> tuple[Path, ...]:
+    path = Path(spec)
+    if path.is_file():
+        return (path,)
+    if path.is_dir():
+        candidates = [p for p in path.iterdir() if p.is_file()]
+    else:
+        candidates = [Path(p) for p in glob.glob(str(spec), recursive=True)]
+    files = tuple(sorted(p for p in candidates if p.name.endswith(BRONZE_SUFFIXES)))
+    if not files:
+        raise FileNotFoundError(f"No bronze CSV files found for {spec}")
+    return files
+
+# Content fingerprint of a bronze source. A single file keeps its plain file
+# fingerprint, so watermarks written before multi-file sources stay valid;
+# otherwise the names and contents of all files are hashed. It is derived
+# from the file fingerprints (see fingerprint_bronze), no file is read again.
+def bronze_fingerprint(files: Sequence[Path], fingerprints: dict[str, str]) -> str:
+    if len(files) == 1:
+        return fingerprints[files[0].as_posix()]
+    h = hashlib.sha256()
+    for path in files:
+        h.update(f"{path.name}:{fingerprints[path.as_posix()]}\n".encode())
+    return h.hexdigest()
+
+def add_provenance(df: pd.DataFrame, path: Path, ingested_at: datetime) -> pd.DataFrame:
+    return df.assign(
+        source_file=pd.Series(path.name, index=df.index, dtype="string"),
+        ingested_at=pd.Timestamp(ingested_at),
+    )
+
+# Read all files of a source with reader (extract_matches or
+# extract_player_stats) and concatenate them with their provenance.
+# With workers > 1 the files are parsed in a process pool; reader must then
+# be a module-level function so it can be sent to the workers.
+def read_bronze(
+    files: Sequence[Path],
+    reader: Callable[[Path], pd.DataFrame],
+    workers: int = 1,
+    ingested_at: datetime | None = None,
+) -> pd.DataFrame:
+    ingested_at = ingested_at or datetime.now()
+    if workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+            frames = list(pool.map(reader, files))
+    else:
+        frames = [reader(path) for path in files]
+
+    frames = [add_provenance(df, path, ingested_at) for df, path in zip(frames, files)]
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+# Streaming counterpart of read_bronze: the chunks of every file in turn.
+def iter_bronze(
+    files: Sequence[Path],
+    iter_chunks: Callable[[Path, int], Iterator[pd.DataFrame]],
+    chunksize: int,
+    ingested_at: datetime | None = None,
+) -> Iterator[pd.DataFrame]:
+    ingested_at = ingested_at or datetime.now()
+    for path in files:
+        for chunk in iter_chunks(path, chunksize):
+            yield add_provenance(chunk, path, ingested_at)
@@ -0,0 +1,288 @@
+from __future__ import annotations
+from collections.abc import Sequence
+from dataclasses import dataclass
+import duckdb
+import pandas as pd
+from session import Session, table_exists
+
+# Team OLAP cube: team-match measures pre-aggregated over every combination
+# of team x league x season x month (GROUP BY CUBE), so dashboard slices read
+# a few cube rows instead of scanning fact_match.
+# The cube stores additive measures only (sums and counts); averages are
+# derived from them at query time, which gives the same result on the cube
+# and on the facts.
+CUBE_TABLE = "gold_team_cube"
+
+# Team-match rows: each match seen from the home and from the away team.
+# Attendance belongs to the home team's matches.
+TEAM_MATCH_ROWS = """
+    WITH sides AS (
+        SELECT
+            match_id, season, league, match_date, stadium, referee, attendance,
+            'home' AS venue,
+            home_team_sk AS team_sk,
+            home_goals AS goals_for, away_goals AS goals_against,
+            home_shots AS shots_for, away_shots AS shots_against,
+            home_xG AS xg_for, away_xG AS xg_against,
+            home_possession_pct AS possession_pct,
+            CASE result WHEN 'H' THEN 'W' WHEN 'A' THEN 'L' ELSE 'D' END AS outcome
+        FROM fact_match
+        UNION ALL
+        SELECT
+            match_id, season, league, match_date, stadium, referee, NULL AS attendance,
+            'away' AS venue,
+            away_team_sk AS team_sk,
+            away_goals AS goals_for, home_goals AS goals_against,
+            away_shots AS shots_for, home_shots AS shots_against,
+            away_xG AS xg_for, home_xG AS xg_against,
+            away_possession_pct AS possession_pct,
+            CASE result WHEN 'A' THEN 'W' WHEN 'H' THEN 'L' ELSE 'D' END AS outcome
+        FROM fact_match
+    )
+    SELECT
+        s.match_id,
+        s.team_sk,
+        t.team_name AS team,
+        s.league,
+        s.season,
+        DATE_TRUNC('month', s.match_date)::DATE AS month,
+        s.venue,
+        s.stadium,
+        s.referee,
+        1 AS matches,
+        (s.outcome = 'W')::INTEGER AS wins,
+        (s.outcome = 'D')::INTEGER AS draws,
+        (s.outcome = 'L')::INTEGER AS losses,
+        CASE s.outcome WHEN 'W' THEN 3 WHEN 'D' THEN 1 ELSE 0 END AS points,
+        s.goals_for,
+        s.goals_against,
+        s.shots_for,
+        s.shots_against,
+        s.xg_for,
+        s.xg_against,
+        s.possession_pct AS possession_sum,
+        (s.possession_pct IS NOT NULL)::INTEGER AS possession_n,
+        s.attendance AS attendance_sum,
+        (s.attendance IS NOT NULL)::INTEGER AS attendance_n
+    FROM sides s
+    LEFT JOIN dim_team t ON t.team_sk = s.team_sk
+"""
+
+# Slicing dimensions stored in the cube -> their columns
+CUBE_DIMENSIONS = {
+    "team": ("team_sk", "team"),
+    "league": ("league",),
+    "season": ("season",),
+    "month": ("month",),
+}
+
+# Further dimensions only the facts can answer
+FACT_DIMENSIONS = ("venue", "stadium", "referee")
+
+# Additive measure -> cube column type
+MEASURES = {
+    "matches": "BIGINT",
+    "wins": "BIGINT",
+    "draws": "BIGINT",
+    "losses": "BIGINT",
+    "points": "BIGINT",
+    "goals_for": "BIGINT",
+    "goals_against": "BIGINT",
+    "shots_for": "BIGINT",
+    "shots_against": "BIGINT",
+    "xg_for": "DOUBLE",
+    "xg_against": "DOUBLE",
+    "possession_sum": "DOUBLE",
+    "possession_n": "BIGINT",
+    "attendance_sum": "BIGINT",
+    "attendance_n": "BIGINT",
+}
+
+# Metrics a slice can ask for, as aggregates of the additive measures (valid
+# over cube rows and team-match rows alike)
+METRICS = {
+    **{m: f"SUM({m})::BIGINT" for m in (
+        "matches", "wins", "draws", "losses", "points",
+        "goals_for", "goals_against", "shots_for", "shots_against",
+    )},
+    "xg_for": "SUM(xg_for)",
+    "xg_against": "SUM(xg_against)",
+    "goal_diff": "(SUM(goals_for) - SUM(goals_against))::BIGINT",
+    "xg_diff": "SUM(xg_for) - SUM(xg_against)",
+    "goals_per_match": "SUM(goals_for) / NULLIF(SUM(matches), 0)",
+    "xg_per_match": "SUM(xg_for) / NULLIF(SUM(matches), 0)",
+    "shots_per_match": "SUM(shots_for) / NULLIF(SUM(matches), 0)",
+    "avg_possession_pct": "SUM(possession_sum) / NULLIF(SUM(possession_n), 0)",
+    "avg_home_attendance": "SUM(attendance_sum) / NULLIF(SUM(attendance_n), 0)",
+}
+
+# Rebuild the cube from fact_match: one scan, all 16 groupings.
+# grouping_id is GROUPING(team_sk, league, season, month): bit set = the
+# dimension is rolled up (0 = finest grain, 15 = grand total).
+def build_cube(session: Session) -> None:
+    columns = [c for cols in CUBE_DIMENSIONS.values() for c in cols]
+    measures = ", ".join(f"SUM({m})::{t} AS {m}" for m, t in MEASURES.items())
+    cube = ", ".join(
+        cols[0] if len(cols) == 1 else f"({', '.join(cols)})" for cols in CUBE_DIMENSIONS.values()
+    )
+    with session.transaction():
+        session.con.execute(f"""
+            CREATE OR REPLACE TABLE {CUBE_TABLE} AS
+            SELECT
+                GROUPING(team_sk, league, season, month) AS grouping_id,
+                {", ".join(columns)},
+                {measures}
+            FROM ({TEAM_MATCH_ROWS})
+            GROUP BY CUBE ({cube})
+            ORDER BY grouping_id, league, season, month, team
+        """)
+
+# Cube keys (team_sk, league, season, month) of the team-match rows of the
+# given matches: the leaf cells they fall into.
+def cube_keys(con: duckdb.DuckDBPyConnection, match_ids: set[str]) -> pd.DataFrame:
+    con.register("cube_ids_df", pd.DataFrame({"match_id": sorted(match_ids)}))
+    keys = con.execute(f"""
+        SELECT DISTINCT team_sk, league, season, month
+        FROM ({TEAM_MATCH_ROWS})
+        WHERE match_id IN (SELECT match_id FROM cube_ids_df)
+    """).df()
+    con.unregister("cube_ids_df")
+    return keys
+
+# Incremental maintenance after the facts of match_ids changed (previous:
+# their cube_keys() taken before the facts were updated). The measures are
+# additive, so only the cells the affected keys fall into change: those
+# cells are deleted, the leaf cells (grouping_id 0) recomputed from the
+# facts of their keys, then each coarser grouping, one level of rolled-up
+# dimensions at a time, from a finer grouping updated before it. A
+# warehouse without the cube gets it built in full.
+def update_cube(session: Session, match_ids: set[str], previous: pd.DataFrame) -> None:
+    if not session.table_exists(CUBE_TABLE):
+        build_cube(session)
+        return
+
+    con = session.con
+    keys = pd.concat([previous, cube_keys(con, match_ids)]).drop_duplicates()
+    if keys.empty:
+        return
+    dimensions = list(CUBE_DIMENSIONS)
+    key_cols = {d: cols[0] for d, cols in CUBE_DIMENSIONS.items()}
+    # GROUPING() bit of each dimension: set = rolled up, first argument highest
+    bits = {d: 1 << i for i, d in enumerate(reversed(dimensions))}
+    groupings = range(2 ** len(dimensions))
+    measures = ", ".join(f"SUM({m})::{t} AS {m}" for m, t in MEASURES.items())
+
+    def kept(grouping_id: int) -> list[str]:
+        return [d for d in dimensions if not grouping_id & bits[d]]
+
+    def of_keys(grouping_id: int) -> str:
+        return " AND ".join(
+            [f"r.{key_cols[d]} IS NOT DISTINCT FROM k.{key_cols[d]}" for d in kept(grouping_id)]
+            or ["TRUE"]
+        )
+
+    # A grouping is rolled up from the grouping that keeps one more
+    # dimension, preferring the dimension with the fewest values
+    def finer(grouping_id: int) -> int:
+        dim = next(d for d in ("league", "season", "month", "team") if grouping_id & bits[d])
+        return grouping_id & ~bits[dim]
+
+    con.register("cube_keys_df", keys)
+    with session.transaction():
+        cells = " UNION ALL ".join(
+            f"SELECT DISTINCT {g} AS grouping_id, "
+            + ", ".join(key_cols[d] if d in kept(g) else f"NULL AS {key_cols[d]}" for d in dimensions)
+            + " FROM cube_keys_df"
+            for g in groupings
+        )
+        con.execute(f"""
+            DELETE FROM {CUBE_TABLE} r USING ({cells}) c
+            WHERE r.grouping_id = c.grouping_id
+              AND {" AND ".join(f"r.{c} IS NOT DISTINCT FROM c.{c}" for c in key_cols.values())}
+        """)
+
+        columns = [c for cols in CUBE_DIMENSIONS.values() for c in cols]
+        con.execute(f"""
+            INSERT INTO {CUBE_TABLE} BY NAME
+            SELECT 0 AS grouping_id, {", ".join(columns)}, {measures}
+            FROM ({TEAM_MATCH_ROWS}) r
+            SEMI JOIN cube_keys_df k ON {of_keys(0)}
+            GROUP BY {", ".join(columns)}
+        """)
+
+        for level in range(1, len(dimensions) + 1):
+            selects = []
+            for g in (g for g in groupings if g.bit_count() == level):
+                cols = [c for d in kept(g) for c in CUBE_DIMENSIONS[d]]
+                selects.append(f"""
+                    SELECT {g} AS grouping_id, {"".join(f"{c}, " for c in cols)}{measures}
+                    FROM {CUBE_TABLE} r
+                    WHERE r.grouping_id = {finer(g)}
+                      AND EXISTS (SELECT 1 FROM cube_keys_df k WHERE {of_keys(g)})
+                    {f"GROUP BY {', '.join(cols)}" if cols else ""}
+                """)
+            con.execute(f"INSERT INTO {CUBE_TABLE} BY NAME {' UNION ALL BY NAME '.join(selects)}")
+    con.unregister("cube_keys_df")
+
+# A planned slice: its SQL, parameters and where it is answered from
+@dataclass(frozen=True)
+class SliceQuery:
+    sql: str
+    params: list
+    source: str
+
+    def run(self, con: duckdb.DuckDBPyConnection) -> pd.DataFrame:
+        return con.execute(self.sql, self.params).df()
+
+# Plan a slice: metrics grouped by dimensions, with equality filters
+# (dimension -> value or list of values).
+# It is answered from the cube when the cube exists and every grouped or
+# filtered dimension is a cube dimension (reading the cube rows of exactly
+# that grouping), otherwise from the team-match rows of the facts.
+def plan_slice(
+    con: duckdb.DuckDBPyConnection,
+    metrics: Sequence[str],
+    by: Sequence[str] = (),
+    filters: dict[str, object] | None = None,
+) -> SliceQuery:
+    filters = filters or {}
+    unknown = [m for m in metrics if m not in METRICS]
+    if unknown or not metrics:
+        raise ValueError(f"Unknown metrics: {unknown} (expected some of {sorted(METRICS)})")
+    dimensions = [*CUBE_DIMENSIONS, *FACT_DIMENSIONS]
+    unknown = [d for d in [*by, *filters] if d not in dimensions]
+    if unknown:
+        raise ValueError(f"Unknown dimensions: {unknown} (expected some of {dimensions})")
+
+    used = set(by) | set(filters)
+    from_cube = used <= CUBE_DIMENSIONS.keys() and table_exists(con, CUBE_TABLE)
+
+    where, params = [], []
+    if from_cube:
+        # Rolled-up dimensions have their bit set, in GROUPING() argument order
+        rolled_up = [d not in used for d in CUBE_DIMENSIONS]
+        grouping_id = sum(1 << i for i, r in enumerate(reversed(rolled_up)) if r)
+        where.append(f"grouping_id = {grouping_id}")
+        source = CUBE_TABLE
+    else:
+        source = f"({TEAM_MATCH_ROWS})"
+    for dim, value in filters.items():
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        where.append(f"{dim} IN ({', '.join('?' for _ in values)})")
+        params.extend(values)
+
+    select = [*by, *(f"{METRICS[m]} AS {m}" for m in metrics)]
+    sql = f"SELECT {', '.join(select)} FROM {source}"
+    if where:
+        sql += f" WHERE {' AND '.join(where)}"
+    if by:
+        sql += f" GROUP BY {', '.join(by)} ORDER BY {', '.join(by)}"
+    return SliceQuery(sql, params, "cube" if from_cube else "facts")
+
+def query_slice(
+    con: duckdb.DuckDBPyConnection,
+    metrics: Sequence[str],
+    by: Sequence[str] = (),
+    filters: dict[str, object] | None = None,
+) -> pd.DataFrame:
+    return plan_slice(con, metrics, by, filters).run(con)
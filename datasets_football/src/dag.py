@@ -0,0 +1,59 @@
+from __future__ import annotations
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+# A named unit of work with the names of the nodes it depends on.
+@dataclass(frozen=True)
+class Node:
+    name: str
+    sql: str
+    deps: tuple[str, ...] = ()
+
+# Dependency order of the nodes (raises on unknown deps or cycles).
+def topological_order(nodes: list[Node]) -> list[Node]:
+    by_name = {n.name: n for n in nodes}
+    for n in nodes:
+        unknown = set(n.deps) - by_name.keys()
+        if unknown:
+            raise ValueError(f"Node {n.name} depends on unknown nodes {sorted(unknown)}")
+
+    ordered: list[Node] = []
+    done: set[str] = set()
+    pending = list(nodes)
+    while pending:
+        ready = [n for n in pending if set(n.deps) <= done]
+        if not ready:
+            raise ValueError(f"Dependency cycle between {[n.name for n in pending]}")
+        for n in ready:
+            ordered.append(n)
+            done.add(n.name)
+        pending = [n for n in pending if n.name not in done]
+    return ordered
+
+# Execute the nodes on a thread pool: a node is submitted as soon as all its
+# dependencies have finished, so independent nodes run concurrently and the
+# total time follows the critical path. The first failure cancels the nodes
+# not yet started and is re-raised.
+def run_dag(nodes: list[Node], execute: Callable[[Node], None], workers: int = 4) -> None:
+    topological_order(nodes)
+    done: set[str] = set()
+    pending = {n.name: n for n in nodes}
+    running: dict[Future, Node] = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            for name, node in list(pending.items()):
+                if set(node.deps) <= done:
+                    running[pool.submit(execute, node)] = node
+                    del pending[name]
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                node = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    for f in running:
+                        f.cancel()
+                    raise error
+                done.add(node.name)
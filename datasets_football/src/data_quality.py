@@ -1,65 +1,243 @@
 from __future__ import annotations
+import time
+from dataclasses import dataclass, field
 import pandas as pd
+import duckdb
+from integrity import ForeignKey, check_foreign_key
+
+# Declarative data quality rule.
+# kind is one of:
+#   required  - columns must exist in the dataset
+#   non_empty - dataset must have at least one row
+#   row       - `condition` is a SQL predicate that is TRUE for violating rows
+#   unique    - `columns[0]` must not repeat (NULLs ignored)
+#   fk        - every non-NULL `columns[0]` must exist in `parent` (dataset, column)
+# Rules that reference a column missing from the dataset are skipped, so
+# optional columns are only checked when present.
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    dataset: str
+    kind: str
+    message: str
+    columns: tuple[str, ...] = ()
+    condition: str | None = None
+    parent: tuple[str, str] | None = None
+
+@dataclass
+class RuleResult:
+    rule: str
+    dataset: str
+    message: str
+    violations: int
+    sample: list = field(default_factory=list)
+    # Wall time of the statement that evaluated the rule (shared by all
+    # row/unique rules of a dataset, which are evaluated in one scan) plus
+    # the time spent fetching its sample
+    seconds: float = 0.0
+
+    @property
+    def passed(self) -> bool:
+        return self.violations == 0
+
+@dataclass
+class DQReport:
+    results: list[RuleResult] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return all(r.passed for r in self.results)
+
+    @property
+    def failures(self) -> list[RuleResult]:
+        return [r for r in self.results if not r.passed]
+
+    def to_dict(self) -> dict:
+        return {
+            "ok": self.ok,
+            "rules": [
+                {
+                    "rule": r.rule,
+                    "dataset": r.dataset,
+                    "passed": r.passed,
+                    "violations": r.violations,
+                    "sample": r.sample,
+                    "seconds": round(r.seconds, 6),
+                }
+                for r in self.results
+            ],
+        }
+
+    # Stop the pipeline with every failed rule in the message, not just the first
+    def raise_if_failed(self) -> None:
+        if self.ok:
+            return
+        details = "; ".join(
+            f"{r.message} [{r.rule}: {r.violations} violation(s), e.g. {r.sample}]"
+            for r in self.failures
+        )
+        raise ValueError(f"Data quality failed: {details}")
+
+# Rule registry. Add project rules with register_rule().
+RULES: list[Rule] = [
+    Rule("matches_required_columns", "matches", "required",
+         "Missing columns in matches",
+         columns=("match_id", "date", "home_team", "away_team")),
+    Rule("player_stats_required_columns", "player_stats", "required",
+         "Missing columns in player_stats",
+         columns=("match_id", "team", "player_id", "player_name", "minutes")),
+    Rule("matches_non_empty", "matches", "non_empty", "matches is empty"),
+    Rule("player_stats_non_empty", "player_stats", "non_empty", "player_stats is empty"),
+    Rule("matches_match_id_not_null", "matches", "row",
+         "Null match_id found in matches",
+         columns=("match_id",), condition="match_id IS NULL"),
+    Rule("matches_match_id_unique", "matches", "unique",
+         "Duplicated match_id in matches", columns=("match_id",)),
+    Rule("player_stats_match_fk", "player_stats", "fk",
+         "match_id in stats not found in matches",
+         columns=("match_id",), parent=("matches", "match_id")),
+    Rule("home_possession_pct_range", "matches", "row",
+         "home_possession_pct out of range 0-100",
+         columns=("home_possession_pct",),
+         condition="home_possession_pct < 0 OR home_possession_pct > 100"),
+    Rule("away_possession_pct_range", "matches", "row",
+         "away_possession_pct out of range 0-100",
+         columns=("away_possession_pct",),
+         condition="away_possession_pct < 0 OR away_possession_pct > 100"),
+    Rule("minutes_range", "player_stats", "row",
+         "minutes out of range 0-130",
+         columns=("minutes",), condition="minutes < 0 OR minutes > 130"),
+    Rule("matches_date_parsed", "matches", "row",
+         "Unparseable dates found in matches (date -> NaT)",
+         columns=("date",), condition="date IS NULL"),
+]
+
+def register_rule(rule: Rule) -> None:
+    RULES.append(rule)
+
+def rules_of(*kinds: str) -> list[Rule]:
+    return [r for r in RULES if r.kind in kinds]
+
+# Evaluate rules with DuckDB against the given relations
+# (dataset name -> table, view or registered DataFrame).
+# All row and unique rules of a dataset are computed in a single scan
+# (COUNT FILTER / COUNT DISTINCT aggregates); FKs are hash anti-joins.
+# Samples of offending rows are only fetched for failed rules.
+def validate(
+    con: duckdb.DuckDBPyConnection,
+    relations: dict[str, str],
+    rules: list[Rule] | None = None,
+    allow_empty: bool = False,
+    sample_size: int = 5,
+) -> DQReport:
+    rules = RULES if rules is None else rules
+    if allow_empty:
+        rules = [r for r in rules if r.kind != "non_empty"]
+
+    report = DQReport()
+    columns = {
+        ds: {d[0] for d in con.execute(f"SELECT * FROM {rel} LIMIT 0").description}
+        for ds, rel in relations.items()
+    }
+
+    for dataset, relation in relations.items():
+        ds_rules = [r for r in rules if r.dataset == dataset]
+
+        # Required columns (metadata only)
+        for rule in ds_rules:
+            if rule.kind == "required":
+                missing = sorted(set(rule.columns) - columns[dataset])
+                report.results.append(
+                    RuleResult(rule.name, dataset, rule.message, len(missing), missing)
+                )
+
+        # Single batched scan for non_empty, row and unique rules
+        batched = [
+            r for r in ds_rules
+            if r.kind in ("non_empty", "row", "unique") and set(r.columns) <= columns[dataset]
+        ]
+        if batched:
+            exprs = ["COUNT(*)"]
+            for rule in batched:
+                if rule.kind == "row":
+                    exprs.append(f"COUNT(*) FILTER (WHERE {rule.condition})")
+                elif rule.kind == "unique":
+                    col = rule.columns[0]
+                    exprs.append(f'COUNT("{col}") - COUNT(DISTINCT "{col}")')
+                else:
+                    exprs.append("0")
+            start = time.perf_counter()
+            counts = con.execute(f"SELECT {', '.join(exprs)} FROM {relation}").fetchone()
+            scan_seconds = time.perf_counter() - start
+
+            n_rows = counts[0]
+            for rule, count in zip(batched, counts[1:]):
+                violations = int(n_rows == 0) if rule.kind == "non_empty" else int(count or 0)
+                result = RuleResult(rule.name, dataset, rule.message, violations, seconds=scan_seconds)
+                if violations and rule.kind != "non_empty":
+                    start = time.perf_counter()
+                    result.sample = _sample(con, rule, relation, sample_size)
+                    result.seconds += time.perf_counter() - start
+                report.results.append(result)
+
+        # Referential integrity (anti-join against the parent dataset)
+        for rule in ds_rules:
+            if rule.kind != "fk" or rule.parent[0] not in relations:
+                continue
+            parent_ds, parent_col = rule.parent
+            if rule.columns[0] not in columns[dataset] or parent_col not in columns[parent_ds]:
+                continue
+            start = time.perf_counter()
+            fk = check_foreign_key(
+                con, ForeignKey(relation, rule.columns[0], relations[parent_ds], parent_col), sample_size
+            )
+            report.results.append(RuleResult(
+                rule.name, dataset, rule.message, fk.violations, fk.sample,
+                seconds=time.perf_counter() - start,
+            ))
+
+    return report
+
+def _sample(con: duckdb.DuckDBPyConnection, rule: Rule, relation: str, limit: int) -> list:
+    if rule.kind == "unique":
+        col = rule.columns[0]
+        rows = con.execute(f"""
+            SELECT "{col}" FROM {relation}
+            WHERE "{col}" IS NOT NULL
+            GROUP BY "{col}" HAVING COUNT(*) > 1
+            LIMIT {limit}
+        """).fetchall()
+        return [r[0] for r in rows]
+    cur = con.execute(f"SELECT * FROM {relation} WHERE {rule.condition} LIMIT {limit}")
+    names = [d[0] for d in cur.description]
+    return [dict(zip(names, row)) for row in cur.fetchall()]
 
 # Validate data quality.
 # Ensures required columns, non-empty datasets, key integrity, and reasonable value ranges.
-def data_quality(matches: pd.DataFrame, stats: pd.DataFrame) -> None:
-    required_matches = {"match_id", "date", "home_team", "away_team"}
-    required_stats = {"match_id", "team", "player_id", "player_name", "minutes"}
-
-    missing_m = required_matches - set(matches.columns)
-    missing_s = required_stats - set(stats.columns)
-
-    # Check that all required columns are present in the matches dataset
-    if missing_m:
-        raise ValueError(f"Missing columns in matches: {sorted(missing_m)}")
-    # Check that all required columns are present in the player statistics dataset
-    if missing_s:
-        raise ValueError(f"Missing columns in player_stats: {sorted(missing_s)}")
-    # Ensure the matches dataset is not empty
-    if matches.empty:
-        raise ValueError("matches is empty")
-    # Ensure the player statistics dataset is not empty 
-    if stats.empty:
-        raise ValueError("player_stats is empty")
-
-    # match_id not null/empty and unique in matches
-    if matches["match_id"].isna().any():
-        raise ValueError("Null match_id found in matches")
-    
-    # Ensure match_id is unique to avoid duplicate matches in the dataset
-    if matches["match_id"].duplicated().any():
-        dups = matches.loc[matches["match_id"].duplicated(), "match_id"].head(5).tolist()
-        raise ValueError(f"Duplicated match_id in matches. Example: {dups}")
-
-    # Referential integrity: stats.match_id must exist in matches.match_id
-    missing_fk = set(stats["match_id"].dropna()) - set(matches["match_id"])
-    if missing_fk:
-        example = list(missing_fk)[:5]
-        raise ValueError(f"match_id in stats not found in matches. Example: {example}")
-
-    # Reasonable ranges (ignore NaN)
-    if "home_possession_pct" in matches.columns:
-        bad = matches.loc[
-            (matches["home_possession_pct"] < 0) | (matches["home_possession_pct"] > 100)
-        ]
-        if not bad.empty:
-            raise ValueError("home_possession_pct out of range 0-100")
+# The frames are scanned in place by DuckDB; every rule is evaluated and the
+# pipeline stops with the full list of failures.
+# allow_empty relaxes the non-empty checks for incremental deltas, where a
+# run may legitimately bring new matches without player statistics.
+def data_quality(
+    matches: pd.DataFrame,
+    stats: pd.DataFrame,
+    allow_empty: bool = False,
+) -> DQReport:
+    con = duckdb.connect()
+    con.register("matches_df", matches)
+    con.register("stats_df", stats)
+    report = validate(
+        con, {"matches": "matches_df", "player_stats": "stats_df"}, allow_empty=allow_empty
+    )
+    con.close()
+    report.raise_if_failed()
+    return report
 
-    # Validate that away team possession percentages are within a realistic range (0–100)
-    if "away_possession_pct" in matches.columns:
-        bad = matches.loc[
-            (matches["away_possession_pct"] < 0) | (matches["away_possession_pct"] > 100)
-        ]
-        if not bad.empty:
-            raise ValueError("away_possession_pct out of range 0-100")
-
-    # Validate that player minutes are within a realistic match range
-    if "minutes" in stats.columns:
-        bad = stats.loc[(stats["minutes"] < 0) | (stats["minutes"] > 130)]
-        if not bad.empty:
-            raise ValueError("minutes out of range 0-130")
-
-    # Ensure match dates were correctly parsed
-    if matches["date"].isna().any():
-        raise ValueError("Unparseable dates found in matches (date -> NaT)")
\ No newline at end of file
+# Same rules as data_quality(), evaluated against the staging tables.
+# Used by the DuckDB silver engine, where the data never lands in pandas.
+def check_staging(con: duckdb.DuckDBPyConnection, allow_empty: bool = False) -> DQReport:
+    report = validate(
+        con, {"matches": "stg_matches", "player_stats": "stg_player_stats"}, allow_empty=allow_empty
+    )
+    report.raise_if_failed()
+    return report
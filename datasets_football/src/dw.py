@@ -1,112 +1,615 @@
 from __future__ import annotations
-from pathlib import Path
 import duckdb
+import pandas as pd
+from session import Session, table_exists
+from dag import Node, run_dag, topological_order
+from integrity import WAREHOUSE_FKS, ForeignKey, check_warehouse_integrity, scoped_fks
 
-def build_dw(db_path: Path) -> None:
-    # Connect to the DuckDB analytical database
-    con = duckdb.connect(str(db_path))
+# Gold SELECTs are templates shared by the full rebuild and the incremental upsert.
+# {matches}/{stats} are the silver source relations: the stg_* tables or a
+# pruned read of the Parquet silver layer (see silver.silver_relation).
+# Gold tables, dimensions included, are placeholders too ({fact_match},
+# {dim_team}, ...), so a parallel build can write into shadow tables before
+# swapping them in.
 
-    # DIM: team
-    con.execute("""
-        CREATE OR REPLACE TABLE dim_team AS
-        SELECT
-            ROW_NUMBER() OVER (ORDER BY team_name) AS team_sk,
-            team_name
+# Dimensions are append-only: members are added when first seen and never
+# renumbered or removed, by full and incremental runs alike, so facts keep
+# their keys across runs and can be loaded incrementally.
+# New teams take the keys after the highest team_sk, numbered in name order;
+# dim_player and dim_date are keyed by their natural keys.
+DIMENSIONS = ("dim_team", "dim_player", "dim_date")
+
+DIMENSION_DDL = [
+    "CREATE TABLE IF NOT EXISTS {dim_team} (team_sk BIGINT, team_name VARCHAR)",
+    "CREATE TABLE IF NOT EXISTS {dim_player} (player_id VARCHAR, player_name VARCHAR, position VARCHAR)",
+    """
+    CREATE TABLE IF NOT EXISTS {dim_date} (
+        match_date TIMESTAMP, year BIGINT, month BIGINT, day BIGINT, day_of_week_num VARCHAR
+    )
+    """,
+]
+
+DIM_TEAM_UPSERT = """
+    INSERT INTO {dim_team}
+    SELECT
+        (SELECT COALESCE(MAX(team_sk), 0) FROM {dim_team})
+            + ROW_NUMBER() OVER (ORDER BY team_name) AS team_sk,
+        team_name
+    FROM (
+        SELECT team_name
         FROM (
-            SELECT DISTINCT home_team AS team_name FROM stg_matches
+            SELECT home_team AS team_name FROM {matches}
             UNION
-            SELECT DISTINCT away_team AS team_name FROM stg_matches
+            SELECT away_team AS team_name FROM {matches}
             UNION
-            SELECT DISTINCT team AS team_name FROM stg_player_stats
+            SELECT team AS team_name FROM {stats}
         )
         WHERE team_name IS NOT NULL AND team_name <> ''
-    """)
+          AND team_name NOT IN (SELECT team_name FROM {dim_team})
+    )
+"""
 
-    # DIM: player 
-    con.execute("""
-        CREATE OR REPLACE TABLE dim_player AS
+# New players take the name and position of their latest match; the
+# position is then kept current from dim_player_history.
+DIM_PLAYER_UPSERT = """
+    INSERT INTO {dim_player}
+    SELECT s.player_id, s.player_name, s.position
+    FROM {stats} s
+    LEFT JOIN {matches} m ON m.match_id = s.match_id
+    WHERE s.player_id IS NOT NULL AND s.player_id <> ''
+      AND s.player_id NOT IN (SELECT player_id FROM {dim_player})
+    QUALIFY ROW_NUMBER() OVER (
+        PARTITION BY s.player_id ORDER BY m.date DESC NULLS LAST, s.match_id DESC
+    ) = 1
+"""
+
+# Latest name of every player in a source: the name on their latest match
+# (the order DIM_PLAYER_UPSERT picks the name of a new player by)
+PLAYER_LATEST_NAME = """
+    SELECT s.player_id, s.player_name
+    FROM {stats} s
+    LEFT JOIN {matches} m ON m.match_id = s.match_id
+    WHERE s.player_id IS NOT NULL AND s.player_id <> ''
+    QUALIFY ROW_NUMBER() OVER (
+        PARTITION BY s.player_id ORDER BY m.date DESC NULLS LAST, s.match_id DESC
+    ) = 1
+"""
+
+DIM_DATE_UPSERT = """
+    INSERT INTO {dim_date}
+    SELECT DISTINCT
+        date AS match_date,
+        EXTRACT(year FROM date) AS year,
+        EXTRACT(month FROM date) AS month,
+        EXTRACT(day FROM date) AS day,
+        STRFTIME(date, '%w') AS day_of_week_num
+    FROM {matches}
+    WHERE date IS NOT NULL
+      AND date NOT IN (SELECT match_date FROM {dim_date})
+"""
+
+FACT_MATCH_SELECT = """
+    SELECT
+        m.match_id,
+        m.season,
+        m.league,
+        m.date AS match_date,
+        dt.year,
+        dt.month,
+        m.stadium,
+        m.referee,
+        m.attendance,
+        home_t.team_sk AS home_team_sk,
+        away_t.team_sk AS away_team_sk,
+        m.home_goals,
+        m.away_goals,
+        m.home_shots,
+        m.away_shots,
+        m.home_xG,
+        m.away_xG,
+        m.home_possession_pct,
+        m.away_possession_pct,
+        CASE
+            WHEN m.home_goals > m.away_goals THEN 'H'
+            WHEN m.home_goals < m.away_goals THEN 'A'
+            ELSE 'D'
+        END AS result
+    FROM {matches} m
+    LEFT JOIN {dim_date} dt ON dt.match_date = m.date
+    LEFT JOIN {dim_team} home_t ON home_t.team_name = m.home_team
+    LEFT JOIN {dim_team} away_t ON away_t.team_name = m.away_team
+"""
+
+FACT_PLAYER_MATCH_SELECT = """
+    SELECT
+        s.match_id,
+        fm.match_date,
+        s.player_id,
+        p.player_name,
+        t.team_sk AS team_sk,
+        s.team AS team_name,
+        s.position,
+        s.minutes,
+        s.shots,
+        s.goals,
+        s.assists,
+        s.passes,
+        s.pass_accuracy_pct,
+        s.tackles,
+        s.interceptions,
+        s.fouls_committed,
+        NULLIF(s.card, 'nan') AS card,
+        s.rating
+    FROM {stats} s
+    LEFT JOIN {dim_player} p ON p.player_id = s.player_id
+    LEFT JOIN {dim_team} t ON t.team_name = s.team
+    LEFT JOIN {fact_match} fm ON fm.match_id = s.match_id
+"""
+
+# One row per team and match with the team's cumulative standing in its
+# season and league after that match: points, goals, goal difference and
+# form over its last 5 matches (oldest first, e.g. 'WDLWW'). matchday is the
+# n-th match of the team in the season, so "standings after matchday N" or
+# "standings on date D" is a lookup of each team's latest row instead of an
+# aggregation of the season.
+# Rows are stored sorted by season, league and date, so lookups of one
+# season/league only read the row groups holding it.
+FACT_TEAM_MATCH_SELECT = """
+    WITH sides AS (
         SELECT
-            player_id,
-            ANY_VALUE(player_name) AS player_name,
-            ANY_VALUE(position) AS position
-        FROM stg_player_stats
-        WHERE player_id IS NOT NULL AND player_id <> ''
-        GROUP BY player_id
-    """)
+            match_id, season, league, match_date,
+            home_team_sk AS team_sk, away_team_sk AS opponent_sk, 'H' AS venue,
+            home_goals AS goals_for, away_goals AS goals_against,
+            CASE result WHEN 'H' THEN 'W' WHEN 'A' THEN 'L' ELSE 'D' END AS result
+        FROM {fact_match}
+        UNION ALL
+        SELECT
+            match_id, season, league, match_date,
+            away_team_sk, home_team_sk, 'A',
+            away_goals, home_goals,
+            CASE result WHEN 'A' THEN 'W' WHEN 'H' THEN 'L' ELSE 'D' END
+        FROM {fact_match}
+    ),
+    scored AS (
+        SELECT *, CASE result WHEN 'W' THEN 3 WHEN 'D' THEN 1 ELSE 0 END AS points
+        FROM sides
+    )
+    SELECT
+        match_id,
+        season,
+        league,
+        match_date,
+        team_sk,
+        opponent_sk,
+        venue,
+        goals_for,
+        goals_against,
+        result,
+        points,
+        ROW_NUMBER() OVER season_to_date AS matchday,
+        (SUM(points) OVER season_to_date)::BIGINT AS cum_points,
+        (SUM(goals_for) OVER season_to_date)::BIGINT AS cum_goals_for,
+        (SUM(goals_against) OVER season_to_date)::BIGINT AS cum_goals_against,
+        (SUM(goals_for - goals_against) OVER season_to_date)::BIGINT AS cum_goal_diff,
+        STRING_AGG(result, '') OVER last_5 AS form_last5,
+        (SUM(points) OVER last_5)::BIGINT AS form_points_last5
+    FROM scored
+    WINDOW
+        season_to_date AS (
+            PARTITION BY season, league, team_sk ORDER BY match_date, match_id
+            ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+        ),
+        last_5 AS (
+            PARTITION BY season, league, team_sk ORDER BY match_date, match_id
+            ROWS BETWEEN 4 PRECEDING AND CURRENT ROW
+        )
+    ORDER BY season, league, match_date, match_id, venue DESC
+"""
 
-    # DIM: date
-    con.execute("""
-        CREATE OR REPLACE TABLE dim_date AS
-        SELECT DISTINCT
-            date AS match_date,
-            EXTRACT(year FROM date) AS year,
-            EXTRACT(month FROM date) AS month,
-            EXTRACT(day FROM date) AS day,
-            STRFTIME(date, '%w') AS day_of_week_num
-        FROM stg_matches
-        WHERE date IS NOT NULL
-    """)
+# Season aggregates per player and team: totals, per-90 rates and rating
+# statistics, so player leaderboards read one row per player-season instead
+# of grouping fact_player_match. Per-90 rates are NULL without minutes.
+AGG_PLAYER_SEASON_SELECT = """
+    SELECT
+        m.season,
+        m.league,
+        p.player_id,
+        ANY_VALUE(p.player_name) AS player_name,
+        ANY_VALUE(p.position) AS position,
+        p.team_sk,
+        ANY_VALUE(p.team_name) AS team_name,
+        COUNT(*) AS matches,
+        SUM(p.minutes)::BIGINT AS minutes,
+        SUM(p.goals)::BIGINT AS goals,
+        SUM(p.assists)::BIGINT AS assists,
+        SUM(p.shots)::BIGINT AS shots,
+        SUM(p.passes)::BIGINT AS passes,
+        SUM(p.tackles)::BIGINT AS tackles,
+        SUM(p.interceptions)::BIGINT AS interceptions,
+        SUM(p.fouls_committed)::BIGINT AS fouls_committed,
+        COUNT(*) FILTER (WHERE p.card = 'Yellow') AS yellow_cards,
+        COUNT(*) FILTER (WHERE p.card = 'Red') AS red_cards,
+        SUM(p.goals) * 90.0 / NULLIF(SUM(p.minutes), 0) AS goals_per_90,
+        SUM(p.assists) * 90.0 / NULLIF(SUM(p.minutes), 0) AS assists_per_90,
+        SUM(p.shots) * 90.0 / NULLIF(SUM(p.minutes), 0) AS shots_per_90,
+        SUM(p.passes) * 90.0 / NULLIF(SUM(p.minutes), 0) AS passes_per_90,
+        SUM(p.tackles) * 90.0 / NULLIF(SUM(p.minutes), 0) AS tackles_per_90,
+        SUM(p.interceptions) * 90.0 / NULLIF(SUM(p.minutes), 0) AS interceptions_per_90,
+        COUNT(p.rating) AS rated_matches,
+        AVG(p.rating) AS avg_rating,
+        MIN(p.rating) AS min_rating,
+        MAX(p.rating) AS max_rating,
+        STDDEV_SAMP(p.rating) AS stddev_rating
+    FROM {fact_player_match} p
+    LEFT JOIN {fact_match} m ON m.match_id = p.match_id
+    GROUP BY m.season, m.league, p.player_id, p.team_sk
+    ORDER BY m.season, m.league, p.player_id
+"""
 
-    # FACT: match
-    con.execute("""
-        CREATE OR REPLACE TABLE fact_match AS
+# Type-2 history of each player's position and team: one row per spell, a
+# run of consecutive matches (by date) with the same position and team.
+# A spell is valid from its first match until the next spell starts
+# (valid_to exclusive, NULL for the current spell).
+DIM_PLAYER_HISTORY_SELECT = """
+    WITH changes AS (
         SELECT
-            m.match_id,
-            m.season,
-            m.league,
-            m.date AS match_date,
-            dt.year,
-            dt.month,
-            m.stadium,
-            m.referee,
-            m.attendance,
-            home_t.team_sk AS home_team_sk,
-            away_t.team_sk AS away_team_sk,
-            m.home_goals,
-            m.away_goals,
-            m.home_shots,
-            m.away_shots,
-            m.home_xG,
-            m.away_xG,
-            m.home_possession_pct,
-            m.away_possession_pct,
+            player_id,
+            position,
+            team_sk,
+            team_name,
+            match_date,
+            match_id,
             CASE
-                WHEN m.home_goals > m.away_goals THEN 'H'
-                WHEN m.home_goals < m.away_goals THEN 'A'
-                ELSE 'D'
-            END AS result
-        FROM stg_matches m
-        LEFT JOIN dim_date dt ON dt.match_date = m.date
-        LEFT JOIN dim_team home_t ON home_t.team_name = m.home_team
-        LEFT JOIN dim_team away_t ON away_t.team_name = m.away_team
+                WHEN ROW_NUMBER() OVER w > 1
+                 AND LAG(position) OVER w IS NOT DISTINCT FROM position
+                 AND LAG(team_sk) OVER w IS NOT DISTINCT FROM team_sk
+                THEN 0 ELSE 1
+            END AS new_spell
+        FROM {fact_player_match}
+        WHERE player_id IS NOT NULL
+        WINDOW w AS (PARTITION BY player_id ORDER BY match_date NULLS LAST, match_id)
+    ),
+    spells AS (
+        SELECT
+            *,
+            SUM(new_spell) OVER (
+                PARTITION BY player_id ORDER BY match_date NULLS LAST, match_id
+            ) AS spell
+        FROM changes
+    )
+    SELECT
+        player_id,
+        spell::BIGINT AS version,
+        position,
+        team_sk,
+        team_name,
+        MIN(match_date) AS valid_from,
+        LEAD(MIN(match_date)) OVER (PARTITION BY player_id ORDER BY spell) AS valid_to,
+        LEAD(spell) OVER (PARTITION BY player_id ORDER BY spell) IS NULL AS is_current,
+        COUNT(*) AS matches
+    FROM spells
+    GROUP BY player_id, spell, position, team_sk, team_name
+    ORDER BY player_id, version
+"""
+
+# Gold build as a dependency graph over the (already upserted) dimensions:
+# the facts, then the tables derived from them.
+DW_NODES = [
+    Node("fact_match", FACT_MATCH_SELECT),
+    Node("fact_player_match", FACT_PLAYER_MATCH_SELECT, ("fact_match",)),
+    Node("fact_team_match", FACT_TEAM_MATCH_SELECT, ("fact_match",)),
+    Node("agg_player_season", AGG_PLAYER_SEASON_SELECT, ("fact_player_match", "fact_match")),
+    Node("dim_player_history", DIM_PLAYER_HISTORY_SELECT, ("fact_player_match",)),
+]
+
+# Every table of the warehouse
+DW_TABLES = DIMENSIONS + tuple(node.name for node in DW_NODES)
+
+# Physical order of the facts. Most queries filter by season/date or by
+# player, and DuckDB skips the row groups and segments whose min-max zone
+# maps exclude the filter, so rows are written sorted by these columns.
+# Incremental upserts append their (sorted) delta at the end of the table;
+# cluster_facts() restores the full order.
+FACT_CLUSTER_KEYS = {
+    "fact_match": ("season", "match_date", "match_id"),
+    "fact_player_match": ("player_id", "match_date", "match_id"),
+}
+
+# Optional ART indexes for point lookups (see index_facts), by index name
+FACT_INDEXES = {
+    "fact_match_match_id_idx": ("fact_match", "match_id"),
+    "fact_player_match_player_id_idx": ("fact_player_match", "player_id"),
+}
+
+SHADOW_SUFFIX = "__next"
+
+# Template parameters: silver sources plus the physical name of every gold table.
+def _names(matches: str, stats: str, suffix: str = "") -> dict[str, str]:
+    names = {name: name + suffix for name in DW_TABLES}
+    names.update(matches=matches, stats=stats)
+    return names
+
+# A SELECT producing the rows of table in its cluster order (if it has one).
+def _clustered(table: str, select: str) -> str:
+    keys = FACT_CLUSTER_KEYS.get(table)
+    if not keys:
+        return select
+    return f"SELECT * FROM ({select}) ORDER BY {', '.join(keys)}"
+
+# Rewrite the facts in their cluster order, e.g. after many incremental runs.
+# The ART indexes of the facts are rebuilt if present.
+def cluster_facts(session: Session) -> None:
+    con = session.con
+    indexed = facts_indexed(session)
+    with session.transaction():
+        for table in FACT_CLUSTER_KEYS:
+            con.execute(f"CREATE OR REPLACE TABLE {table} AS {_clustered(table, f'SELECT * FROM {table}')}")
+        if indexed:
+            index_facts(session)
+
+def facts_indexed(session: Session) -> bool:
+    names = [r[0] for r in session.con.execute("SELECT index_name FROM duckdb_indexes()").fetchall()]
+    return all(name in names for name in FACT_INDEXES)
+
+# Create (or drop) the ART indexes of the facts. An index turns a lookup of
+# one match or player into an index scan instead of a (zone map pruned) scan,
+# at the cost of slower inserts. The mode is kept in the database: full
+# rebuilds recreate the indexes when they were present.
+def index_facts(session: Session, enabled: bool = True) -> None:
+    con = session.con
+    for name, (table, column) in FACT_INDEXES.items():
+        if enabled:
+            con.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({column})")
+        else:
+            con.execute(f"DROP INDEX IF EXISTS {name}")
+
+# Create the dimension tables (named as in names, see _names) if missing,
+# and drop the team key sequence earlier versions numbered dim_team with.
+def ensure_dimensions(con: duckdb.DuckDBPyConnection, names: dict[str, str]) -> None:
+    for ddl in DIMENSION_DDL:
+        con.execute(ddl.format(**names))
+    con.execute("DROP SEQUENCE IF EXISTS dim_team_sk_seq")
+
+# Append the members of the silver source not yet in the dimensions.
+def upsert_dimensions(con: duckdb.DuckDBPyConnection, names: dict[str, str]) -> None:
+    ensure_dimensions(con, names)
+    for sql in (DIM_TEAM_UPSERT, DIM_PLAYER_UPSERT, DIM_DATE_UPSERT):
+        con.execute(sql.format(**names))
+
+# Rename players (type 1, player_id and keys unchanged) to the names of
+# latest, a relation of (player_id, player_name); their existing fact rows,
+# which copy the name, follow.
+def rename_players(con: duckdb.DuckDBPyConnection, latest: str, names: dict[str, str]) -> None:
+    dim_player, fact_player_match = names["dim_player"], names["fact_player_match"]
+    renamed = con.execute(f"""
+        UPDATE {dim_player}
+        SET player_name = n.player_name
+        FROM ({latest}) n
+        WHERE n.player_id = {dim_player}.player_id
+          AND {dim_player}.player_name IS DISTINCT FROM n.player_name
+        RETURNING {dim_player}.player_id
+    """).df()
+    if renamed.empty or not table_exists(con, fact_player_match):
+        return
+    con.register("renamed_players_df", renamed)
+    con.execute(f"""
+        UPDATE {fact_player_match}
+        SET player_name = p.player_name
+        FROM {dim_player} p
+        WHERE p.player_id = {fact_player_match}.player_id
+          AND {fact_player_match}.player_id IN (SELECT player_id FROM renamed_players_df)
     """)
+    con.unregister("renamed_players_df")
 
-    # FACT: player-match 
+# Keep the position of dim_player (type 1) in line with the player's current
+# spell in dim_player_history.
+def sync_player_positions(con: duckdb.DuckDBPyConnection) -> None:
     con.execute("""
-        CREATE OR REPLACE TABLE fact_player_match AS
-        SELECT
-            s.match_id,
-            fm.match_date,
-            s.player_id,
-            p.player_name,
-            t.team_sk AS team_sk,
-            s.team AS team_name,
-            s.position,
-            s.minutes,
-            s.shots,
-            s.goals,
-            s.assists,
-            s.passes,
-            s.pass_accuracy_pct,
-            s.tackles,
-            s.interceptions,
-            s.fouls_committed,
-            NULLIF(s.card, 'nan') AS card,
-            s.rating
-        FROM stg_player_stats s
-        LEFT JOIN dim_player p ON p.player_id = s.player_id
-        LEFT JOIN dim_team t ON t.team_name = s.team
-        LEFT JOIN fact_match fm ON fm.match_id = s.match_id
+        UPDATE dim_player
+        SET position = h.position
+        FROM dim_player_history h
+        WHERE h.player_id = dim_player.player_id
+          AND h.is_current
+          AND dim_player.position IS DISTINCT FROM h.position
     """)
 
-    con.close()
\ No newline at end of file
+# Full gold rebuild: the dimensions are upserted, the facts and derived
+# tables rebuilt (facts in their cluster order, indexes recreated if the
+# warehouse had them).
+# workers=1 runs the nodes in dependency order inside the session transaction.
+# workers>1 builds the whole warehouse into shadow tables: the dimensions are
+# copied and upserted, then independent nodes run concurrently, each on its
+# own cursor. The integrity check and the swap of all shadows (dimensions
+# included) into place happen in one transaction, so nothing is committed
+# before it and readers never see a half-built warehouse.
+# Cursors cannot see an uncommitted outer transaction, so the parallel build
+# must not be called inside one. DuckDB already parallelizes every query, so
+# this is rarely faster than workers=1 (see README).
+def build_dw(
+    session: Session,
+    matches: str = "stg_matches",
+    stats: str = "stg_player_stats",
+    workers: int = 1,
+) -> None:
+    con = session.con
+    indexed = facts_indexed(session)
+
+    if workers <= 1:
+        names = _names(matches, stats)
+        with session.transaction():
+            upsert_dimensions(con, names)
+            rename_players(con, PLAYER_LATEST_NAME.format(**names), names)
+            for node in topological_order(DW_NODES):
+                con.execute(
+                    f"CREATE OR REPLACE TABLE {node.name} AS {_clustered(node.name, node.sql.format(**names))}"
+                )
+            sync_player_positions(con)
+            if indexed:
+                index_facts(session)
+
+            # Facts must only reference existing dimension members
+            check_warehouse_integrity(con)
+        return
+
+    if session.in_transaction:
+        raise RuntimeError("Parallel build_dw cannot run inside an open transaction")
+
+    names = _names(matches, stats, SHADOW_SUFFIX)
+
+    def execute(node: Node) -> None:
+        cur = con.cursor()
+        try:
+            cur.execute(
+                f"CREATE OR REPLACE TABLE {names[node.name]} AS {_clustered(node.name, node.sql.format(**names))}"
+            )
+        finally:
+            cur.close()
+
+    try:
+        # Shadow dimensions start as copies of the current ones (or empty)
+        for dim in DIMENSIONS:
+            if session.table_exists(dim):
+                con.execute(f"CREATE OR REPLACE TABLE {names[dim]} AS SELECT * FROM {dim}")
+            else:
+                con.execute(f"DROP TABLE IF EXISTS {names[dim]}")
+        upsert_dimensions(con, names)
+        rename_players(con, PLAYER_LATEST_NAME.format(**names), names)
+
+        run_dag(DW_NODES, execute, workers)
+
+        with session.transaction():
+            check_warehouse_integrity(con, [
+                ForeignKey(names[fk.child], fk.child_col, names[fk.parent], fk.parent_col)
+                for fk in WAREHOUSE_FKS
+            ])
+            for table in DW_TABLES:
+                con.execute(f"DROP TABLE IF EXISTS {table}")
+                con.execute(f"ALTER TABLE {names[table]} RENAME TO {table}")
+            sync_player_positions(con)
+            if indexed:
+                index_facts(session)
+    finally:
+        for table in DW_TABLES:
+            con.execute(f"DROP TABLE IF EXISTS {names[table]}")
+
+# Incremental gold update for the matches in match_ids.
+# New dimension members are appended (see upsert_dimensions) and the facts of the affected matches are deleted and re-inserted from the
+# silver source (staging by default). The tables derived from the facts are
+# only recomputed where the matches belong (or belonged) to: the standings of
+# their seasons/leagues, the season aggregates and position/team history of
+# their players.
+def update_dw(
+    session: Session,
+    match_ids: set[str],
+    matches: str = "stg_matches",
+    stats: str = "stg_player_stats",
+) -> None:
+    con = session.con
+    con.register("delta_ids_df", pd.DataFrame({"match_id": sorted(match_ids)}))
+
+    with session.transaction():
+        # Seasons/leagues and players of the affected matches before the update
+        previous_seasons = _delta_keys(con, "fact_match", "season, league")
+        previous_players = _delta_keys(con, "fact_player_match", "player_id")
+
+        # DIM: team, player, date (append new members)
+        in_delta = "WHERE match_id IN (SELECT match_id FROM delta_ids_df)"
+        upsert_dimensions(
+            con, _names(f"(SELECT * FROM {matches} {in_delta})", f"(SELECT * FROM {stats} {in_delta})")
+        )
+
+        # FACT: match (upsert affected matches)
+        con.execute("DELETE FROM fact_match WHERE match_id IN (SELECT match_id FROM delta_ids_df)")
+        delta_select = f"""
+            {FACT_MATCH_SELECT.format(**_names(matches, stats))}
+            WHERE m.match_id IN (SELECT match_id FROM delta_ids_df)
+        """
+        con.execute(f"INSERT INTO fact_match {_clustered('fact_match', delta_select)}")
+
+        # FACT: player-match (upsert affected matches)
+        con.execute("DELETE FROM fact_player_match WHERE match_id IN (SELECT match_id FROM delta_ids_df)")
+        delta_select = f"""
+            {FACT_PLAYER_MATCH_SELECT.format(**_names(matches, stats))}
+            WHERE s.match_id IN (SELECT match_id FROM delta_ids_df)
+        """
+        con.execute(f"INSERT INTO fact_player_match {_clustered('fact_player_match', delta_select)}")
+
+        # DIM: player names follow each delta player's latest match in the
+        # warehouse (when the source holds it: a backfill of older seasons or
+        # a correction of an older match leaves a newer name alone)
+        rename_players(con, f"""
+            SELECT s.player_id, ANY_VALUE(s.player_name) AS player_name
+            FROM (
+                SELECT player_id, match_id FROM fact_player_match
+                WHERE player_id IN (SELECT player_id FROM fact_player_match {in_delta})
+                QUALIFY ROW_NUMBER() OVER (
+                    PARTITION BY player_id ORDER BY match_date DESC NULLS LAST, match_id DESC
+                ) = 1
+            ) f
+            JOIN {stats} s ON s.player_id = f.player_id AND s.match_id = f.match_id
+            GROUP BY s.player_id
+        """, _names(matches, stats))
+
+        # FACT: team-match (standings of the affected seasons/leagues)
+        _refresh_derived(
+            session, "fact_team_match", "fact_match",
+            pd.concat([previous_seasons, _delta_keys(con, "fact_match", "season, league")]),
+        )
+
+        # AGG: player-season and DIM: player history (affected players)
+        players = pd.concat([previous_players, _delta_keys(con, "fact_player_match", "player_id")])
+        _refresh_derived(session, "agg_player_season", "fact_player_match", players)
+        _refresh_derived(session, "dim_player_history", "fact_player_match", players)
+        sync_player_positions(con)
+
+        # A failed check rolls the transaction back. Dimensions are
+        # append-only and fact rows are only deleted for the delta matches,
+        # so only the rows written for the delta can break a relationship:
+        # the facts of the delta matches (rows outside them are derived from
+        # facts checked by earlier runs) and the derived rows of their players.
+        con.register("delta_players_df", players)
+        of_matches = "c.match_id IN (SELECT match_id FROM delta_ids_df)"
+        of_players = "c.player_id IN (SELECT player_id FROM delta_players_df)"
+        check_warehouse_integrity(con, scoped_fks({
+            "fact_match": of_matches,
+            "fact_player_match": of_matches,
+            "fact_team_match": of_matches,
+            "agg_player_season": of_players,
+            "dim_player_history": of_players,
+        }))
+        con.unregister("delta_players_df")
+
+    con.unregister("delta_ids_df")
+
+# Distinct values of key columns in the rows of a fact table that belong to
+# the delta matches.
+def _delta_keys(con: duckdb.DuckDBPyConnection, table: str, columns: str) -> pd.DataFrame:
+    return con.execute(f"""
+        SELECT DISTINCT {columns} FROM {table}
+        WHERE match_id IN (SELECT match_id FROM delta_ids_df)
+    """).df()
+
+# Recompute the rows of a table derived from a fact table (see DW_NODES) for
+# the key values in scope: its rows with these keys are deleted and rebuilt
+# from the rows of source with the same keys. The derived tables group by
+# these keys, so the rest of the table is left untouched.
+# A warehouse that predates the table gets it built in full.
+def _refresh_derived(session: Session, table: str, source: str, scope: pd.DataFrame) -> None:
+    con = session.con
+    select = next(node.sql for node in DW_NODES if node.name == table)
+    names = _names("stg_matches", "stg_player_stats")
+    if not session.table_exists(table):
+        con.execute(f"CREATE TABLE {table} AS {select.format(**names)}")
+        return
+
+    con.register("refresh_scope_df", scope.drop_duplicates())
+    in_scope = "SEMI JOIN refresh_scope_df sc ON " + " AND ".join(
+        f"sc.{col} IS NOT DISTINCT FROM {{alias}}.{col}" for col in scope.columns
+    )
+    con.execute(f"""
+        DELETE FROM {table}
+        WHERE rowid IN (SELECT t.rowid FROM {table} t {in_scope.format(alias="t")})
+    """)
+    names[source] = f"(SELECT s.* FROM {source} s {in_scope.format(alias='s')})"
+    con.execute(f"INSERT INTO {table} {select.format(**names)}")
+    con.unregister("refresh_scope_df")
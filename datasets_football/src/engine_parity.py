@@ -0,0 +1,91 @@
+from __future__ import annotations
+import sys
+import tempfile
+from pathlib import Path
+import duckdb
+from extract import extract_matches, extract_player_stats
+from bronze import read_bronze, resolve_files
+from transform import transform
+from data_quality import data_quality
+from load import load_staging
+from transform_sql import load_staging_sql
+from session import Session
+
+# Resolve project base directory and bronze inputs
+BASE_DIR = Path(__file__).resolve().parents[1]
+BRONZE = BASE_DIR / "data" / "bronze"
+MATCHES_CSV = BRONZE / "futbol_matches.csv"
+STATS_CSV = BRONZE / "futbol_player_stats.csv"
+
+STAGING_TABLES = ["stg_matches", "stg_player_stats"]
+
+# Set per run, so not expected to match between the two engines
+RUN_COLUMNS = ["ingested_at"]
+
+# Compare the staging tables of two databases: same column names and types,
+# and the same multiset of rows (EXCEPT ALL in both directions), ignoring
+# the run-specific columns.
+# Returns a list of human readable differences (empty when identical).
+def compare_staging(db_a: Path, db_b: Path) -> list[str]:
+    con = duckdb.connect()
+    con.execute(f"ATTACH '{db_a.as_posix()}' AS a (READ_ONLY)")
+    con.execute(f"ATTACH '{db_b.as_posix()}' AS b (READ_ONLY)")
+
+    diffs = []
+    for table in STAGING_TABLES:
+        schema_a = con.execute(f"DESCRIBE a.{table}").fetchall()
+        schema_b = con.execute(f"DESCRIBE b.{table}").fetchall()
+        if [r[:2] for r in schema_a] != [r[:2] for r in schema_b]:
+            diffs.append(f"{table}: schema differs {schema_a} vs {schema_b}")
+            continue
+
+        cols = ", ".join(f'"{r[0]}"' for r in schema_a if r[0] not in RUN_COLUMNS)
+        only_a = con.execute(
+            f"SELECT COUNT(*) FROM (SELECT {cols} FROM a.{table} EXCEPT ALL SELECT {cols} FROM b.{table})"
+        ).fetchone()[0]
+        only_b = con.execute(
+            f"SELECT COUNT(*) FROM (SELECT {cols} FROM b.{table} EXCEPT ALL SELECT {cols} FROM a.{table})"
+        ).fetchone()[0]
+        if only_a or only_b:
+            diffs.append(f"{table}: {only_a} rows only in pandas engine, {only_b} only in duckdb engine")
+
+    con.close()
+    return diffs
+
+# Run both silver engines on the same bronze files and compare the stg_*
+# tables they produce (see compare_staging).
+# The sources may be files, directories or globs (see bronze.resolve_files).
+def engine_diffs(matches_src: str | Path = MATCHES_CSV, stats_src: str | Path = STATS_CSV) -> list[str]:
+    matches_files = resolve_files(matches_src)
+    stats_files = resolve_files(stats_src)
+    with tempfile.TemporaryDirectory() as tmp:
+        pandas_db = Path(tmp) / "pandas.duckdb"
+        duckdb_db = Path(tmp) / "duckdb.duckdb"
+
+        matches, stats = transform(
+            read_bronze(matches_files, extract_matches),
+            read_bronze(stats_files, extract_player_stats),
+        )
+        data_quality(matches, stats)
+        with Session(pandas_db) as session:
+            load_staging(matches, stats, session)
+
+        with Session(duckdb_db) as session:
+            load_staging_sql(matches_files, stats_files, session)
+
+        return compare_staging(pandas_db, duckdb_db)
+
+# Command line check (tests/test_engine_parity.py runs the same comparison
+# under pytest). Exits non-zero on any difference.
+def main(matches_src: str | Path = MATCHES_CSV, stats_src: str | Path = STATS_CSV) -> None:
+    diffs = engine_diffs(matches_src, stats_src)
+    if diffs:
+        print("ENGINE PARITY FAILED")
+        for d in diffs:
+            print(" -", d)
+        sys.exit(1)
+    print("ENGINE PARITY OK:", ", ".join(STAGING_TABLES))
+
+if __name__ == "__main__":
+    # Optional arguments: matches and player stats sources
+    main(*sys.argv[1:3])
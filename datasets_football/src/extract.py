@@ -1,15 +1,143 @@
 from __future__ import annotations
+import codecs
+import csv
+import gzip
+import io
+from collections.abc import Iterator
+from dataclasses import dataclass
 from pathlib import Path
+from typing import BinaryIO
 import pandas as pd
+from schema import STG_MATCHES_SCHEMA, STG_PLAYER_STATS_SCHEMA, pandas_dtypes
 
-# Read matches CSV file. Handles common encoding issues in football datasets.
-def extract_matches(path: Path) -> pd.DataFrame:
-    # Try different encodings to ensure robust CSV ingestion.
+# Bytes read from the start of a bronze file to detect its dialect
+SNIFF_BYTES = 64 * 1024
+# Lines of the prefix given to the dialect sniffer
+SNIFF_LINES = 50
+
+# Decoding of bronze files: UTF-8 (a BOM is skipped), where every byte that
+# is not part of a valid UTF-8 sequence is decoded on its own as cp1252, the
+# usual encoding of legacy exports (latin1 for the five bytes cp1252 leaves
+# undefined). A file is decoded in one pass, whatever mix of UTF-8 and
+# legacy bytes it holds, and never fails to decode.
+DECODE_ERRORS = "bronze_cp1252"
+
+def _decode_cp1252(error: UnicodeDecodeError) -> tuple[str, int]:
+    byte = error.object[error.start:error.start + 1]
     try:
-        return pd.read_csv(path, encoding="latin1")
+        return byte.decode("cp1252"), error.start + 1
     except UnicodeDecodeError:
-        return pd.read_csv(path, encoding="utf-8")
+        return byte.decode("latin1"), error.start + 1
+
+codecs.register_error(DECODE_ERRORS, _decode_cp1252)
+
+# Open a bronze file (plain or .gz) as a stream of UTF-8 bytes, decoded as
+# described above while it is read.
+def open_bronze(path: Path) -> BinaryIO:
+    opener = gzip.open if path.name.endswith(".gz") else open
+    return io.BufferedReader(_DecodedStream(opener(path, "rb")), buffer_size=1 << 20)
+
+class _DecodedStream(io.RawIOBase):
+    def __init__(self, raw: BinaryIO, block_size: int = 1 << 20) -> None:
+        self._raw = raw
+        self._block_size = block_size
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")(DECODE_ERRORS)
+        self._pending = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            block = self._raw.read(self._block_size)
+            self._pending = memoryview(self._decoder.decode(block, final=not block).encode("utf-8"))
+            if not block:
+                break
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def close(self) -> None:
+        self._raw.close()
+        super().close()
+
+# Dialect of a bronze CSV file (see sniff_stream)
+@dataclass(frozen=True)
+class CsvFormat:
+    sep: str = ","
+    quotechar: str = '"'
+
+    # Keyword arguments of pd.read_csv, for a stream from open_bronze
+    def read_options(self) -> dict[str, str]:
+        return {"encoding": "utf-8", "sep": self.sep, "quotechar": self.quotechar}
+
+# Detect the delimiter, quote character and header of a bronze stream from
+# open_bronze on the first lines of its buffered prefix. The prefix is only
+# peeked at, so the file is then parsed from its start in the same pass.
+def sniff_stream(f: io.BufferedReader, sample_size: int = SNIFF_BYTES) -> tuple[CsvFormat, list[str]]:
+    text = f.peek(sample_size)[:sample_size].decode("utf-8", errors="ignore")
+    lines = text.splitlines()[:SNIFF_LINES]
+    try:
+        dialect = csv.Sniffer().sniff("\n".join(lines), delimiters=",;\t|")
+        fmt = CsvFormat(dialect.delimiter, dialect.quotechar)
+    except csv.Error:
+        # e.g. a single column: keep the default dialect
+        fmt = CsvFormat()
+    header = next(csv.reader(io.StringIO(text), delimiter=fmt.sep, quotechar=fmt.quotechar), [])
+    return fmt, header
+
+# Read matches CSV file. Mixed UTF-8 / legacy bytes are decoded per byte
+# (see DECODE_ERRORS) and the dialect is detected per file.
+# typed parses the columns into their silver dtypes while reading (see read_typed).
+def extract_matches(path: Path, typed: bool = True) -> pd.DataFrame:
+    return read_typed(path, STG_MATCHES_SCHEMA, typed)
 
 # Read player statistics CSV file.
-def extract_player_stats(path: Path) -> pd.DataFrame:
-    return pd.read_csv(path, encoding="utf-8")
\ No newline at end of file
+def extract_player_stats(path: Path, typed: bool = True) -> pd.DataFrame:
+    return read_typed(path, STG_PLAYER_STATS_SCHEMA, typed)
+
+# Read a bronze CSV in one pass, parsed with the declared schema as far as
+# that cannot fail: string columns are read as strings and dates parsed with
+# parse_dates, numbers are parsed by the reader's type inference (int64 /
+# float64). A column with values that do not parse (e.g. text in a numeric
+# column) is read as text and cleaned by transform().
+# The file is opened and decoded once: dialect and header come from the
+# prefix of the same stream (see sniff_stream).
+# With pyarrow installed its multithreaded CSV reader is used.
+def read_typed(path: Path, schema: dict[str, str], typed: bool = True) -> pd.DataFrame:
+    with open_bronze(path) as f:
+        fmt, header = sniff_stream(f)
+        options = fmt.read_options()
+        if not typed:
+            return pd.read_csv(f, **options)
+
+        if _has_pyarrow():
+            options["engine"] = "pyarrow"
+        return pd.read_csv(f, **_typed_options(schema, header), **options)
+
+# Keyword arguments of pd.read_csv parsing the schema columns present in
+# header as far as that cannot fail (see read_typed).
+def _typed_options(schema: dict[str, str], header: list[str]) -> dict:
+    dtypes, dates = pandas_dtypes(schema)
+    return {
+        "dtype": {c: t for c, t in dtypes.items() if c in header and t == "string"},
+        "parse_dates": [c for c in dates if c in header],
+        "date_format": "ISO8601",
+    }
+
+def _has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+# Streaming reader: yield a bronze file in bounded-size chunks so that peak
+# memory depends on chunksize, not on the file size. Like read_typed, the
+# file is opened once and the chunks are parsed with the schema, so they
+# have the column types of the non-streaming read.
+def iter_csv(path: Path, chunksize: int, schema: dict[str, str]) -> Iterator[pd.DataFrame]:
+    with open_bronze(path) as f:
+        fmt, header = sniff_stream(f)
+        yield from pd.read_csv(f, chunksize=chunksize, **_typed_options(schema, header), **fmt.read_options())
@@ -0,0 +1,191 @@
+from __future__ import annotations
+import hashlib
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+import duckdb
+from session import Session
+from schema import PROVENANCE_SCHEMA, STG_MATCHES_SCHEMA, STG_PLAYER_STATS_SCHEMA, typed_select
+
+WATERMARK_TABLE = "etl_watermarks"
+FILE_WATERMARK_TABLE = "etl_bronze_files"
+
+# Per-source watermark persisted in the warehouse after every successful load.
+# row_count is the number of rows processed by the run that set the watermark;
+# files holds the fingerprint of every bronze file of the source (path ->
+# sha256), so an incremental run only re-reads the files that changed.
+@dataclass
+class Watermark:
+    source: str
+    fingerprint: str
+    row_count: int = 0
+    files: dict[str, str] = field(default_factory=dict)
+
+# Content fingerprint of a bronze file (sha256, read in blocks so memory stays flat).
+def file_fingerprint(path: Path, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+# Fingerprint of every file of a bronze source, keyed as in Watermark.files
+def file_fingerprints(files: Sequence[Path]) -> dict[str, str]:
+    return {path.as_posix(): file_fingerprint(path) for path in files}
+
+# Bronze files new or changed since the watermark (all of them without one)
+def changed_files(files: Sequence[Path], fingerprints: dict[str, str], previous: Watermark | None) -> list[Path]:
+    seen = previous.files if previous is not None else {}
+    return [path for path in files if seen.get(path.as_posix()) != fingerprints[path.as_posix()]]
+
+def ensure_watermark_table(con: duckdb.DuckDBPyConnection) -> None:
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {WATERMARK_TABLE} (
+            source VARCHAR PRIMARY KEY,
+            fingerprint VARCHAR,
+            row_count BIGINT,
+            updated_at TIMESTAMP
+        )
+    """)
+    # High-water marks of earlier versions, never read
+    for col in ("max_date", "max_match_id"):
+        con.execute(f"ALTER TABLE {WATERMARK_TABLE} DROP COLUMN IF EXISTS {col}")
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {FILE_WATERMARK_TABLE} (
+            source VARCHAR,
+            file VARCHAR,
+            fingerprint VARCHAR,
+            updated_at TIMESTAMP,
+            PRIMARY KEY (source, file)
+        )
+    """)
+
+def read_watermarks(session: Session) -> dict[str, Watermark]:
+    con = session.con
+    ensure_watermark_table(con)
+    watermarks = {
+        r[0]: Watermark(*r)
+        for r in con.execute(f"SELECT source, fingerprint, row_count FROM {WATERMARK_TABLE}").fetchall()
+    }
+    for source, file, fingerprint in con.execute(
+        f"SELECT source, file, fingerprint FROM {FILE_WATERMARK_TABLE}"
+    ).fetchall():
+        if source in watermarks:
+            watermarks[source].files[file] = fingerprint
+    return watermarks
+
+def write_watermarks(session: Session, watermarks: list[Watermark]) -> None:
+    con = session.con
+    ensure_watermark_table(con)
+    now = datetime.now()
+    for wm in watermarks:
+        con.execute(
+            f"INSERT OR REPLACE INTO {WATERMARK_TABLE} (source, fingerprint, row_count, updated_at) "
+            "VALUES (?, ?, ?, ?)",
+            [wm.source, wm.fingerprint, wm.row_count, now],
+        )
+        con.execute(f"DELETE FROM {FILE_WATERMARK_TABLE} WHERE source = ?", [wm.source])
+        if wm.files:
+            con.executemany(
+                f"INSERT INTO {FILE_WATERMARK_TABLE} VALUES (?, ?, ?, ?)",
+                [[wm.source, file, fingerprint, now] for file, fingerprint in wm.files.items()],
+            )
+
+# Watermark computed from a staging table, for loads that never held the
+# data in pandas (DuckDB engine, streaming mode).
+def staged_watermark(
+    session: Session,
+    source: str,
+    table: str,
+    fingerprint: str,
+    files: dict[str, str],
+) -> Watermark:
+    row_count = session.con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    return Watermark(source, fingerprint, row_count, files)
+
+# Select the cleaned rows that must be (re)processed in an incremental run,
+# given the rows of the bronze files that changed since the last run
+# (reread: staging table -> names of those files).
+# Every row is reduced to a hash of its content (provenance columns aside)
+# and compared with the staged rows that came from the same files (rows of
+# unknown origin count when their match is in the re-read rows): a match is
+# part of the delta when any of its rows is new, changed or gone. The delta
+# holds whole matches: the rows a delta match has in unchanged files are
+# taken back from staging. Unchanged files are never read, so the work
+# grows with the changed files, not with the bronze history.
+# Returns the delta frames and the affected match_ids.
+def select_delta(
+    matches: pd.DataFrame,
+    stats: pd.DataFrame,
+    reread: dict[str, list[str]],
+    session: Session,
+) -> tuple[pd.DataFrame, pd.DataFrame, set[str]]:
+    con = session.con
+    sources = (
+        (matches, "stg_matches", STG_MATCHES_SCHEMA),
+        (stats, "stg_player_stats", STG_PLAYER_STATS_SCHEMA),
+    )
+
+    delta_ids = set()
+    origins = {}
+    for df, table, schema in sources:
+        staged = set(con.execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = ?", [table]
+        ).df()["column_name"])
+        # Staged rows that came from the re-read files
+        con.register(f"{table}_ids_df", pd.DataFrame({"match_id": df["match_id"].drop_duplicates()}))
+        of_ids = f"match_id IN (SELECT match_id FROM {table}_ids_df)"
+        origins[table] = (
+            f"COALESCE(source_file IN (SELECT UNNEST(?::VARCHAR[])), {of_ids})"
+            if "source_file" in staged else of_ids
+        )
+        params = [reread[table]] if "source_file" in staged else []
+
+        columns = [c for c in df.columns if c in staged and c not in PROVENANCE_SCHEMA]
+        quoted = ", ".join(f'"{c}"' for c in columns)
+        row_hash = f"hash({quoted})"
+        con.register("delta_df", df)
+        rows = con.execute(f"""
+            WITH new AS (
+                SELECT match_id, {row_hash} AS row_hash
+                FROM (SELECT {typed_select(columns, schema)} FROM delta_df)
+            ),
+            old AS (
+                SELECT match_id, {row_hash} AS row_hash FROM {table}
+                WHERE {origins[table]}
+            )
+            SELECT DISTINCT match_id FROM (
+                (SELECT * FROM new EXCEPT ALL SELECT * FROM old)
+                UNION ALL
+                (SELECT * FROM old EXCEPT ALL SELECT * FROM new)
+            )
+        """, params).fetchall()
+        con.unregister("delta_df")
+        delta_ids |= {r[0] for r in rows}
+
+    con.register("delta_ids_df", pd.DataFrame({"match_id": sorted(delta_ids)}))
+    frames = []
+    for df, table, _ in sources:
+        params = [reread[table]] if "?" in origins[table] else []
+        kept = con.execute(f"""
+            SELECT * FROM {table}
+            WHERE match_id IN (SELECT match_id FROM delta_ids_df) AND NOT {origins[table]}
+        """, params).df()
+        df = df.loc[df["match_id"].isin(delta_ids)]
+        frames.append(pd.concat([df, kept], ignore_index=True) if len(kept) else df)
+        con.unregister(f"{table}_ids_df")
+    con.unregister("delta_ids_df")
+    return frames[0], frames[1], delta_ids
+
+# Seasons of the staged matches, to rewrite the silver partitions a delta
+# moves rows out of
+def staged_seasons(session: Session, match_ids: set[str]) -> set[str]:
+    session.con.register("delta_ids_df", pd.DataFrame({"match_id": sorted(match_ids)}))
+    rows = session.con.execute("""
+        SELECT DISTINCT season FROM stg_matches
+        WHERE match_id IN (SELECT match_id FROM delta_ids_df) AND season IS NOT NULL
+    """).fetchall()
+    session.con.unregister("delta_ids_df")
+    return {r[0] for r in rows}
@@ -0,0 +1,100 @@
+from __future__ import annotations
+import argparse
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+import duckdb
+
+# Referential integrity checks that never materialise key sets in Python:
+# in DuckDB a foreign key is checked with a hash anti-join.
+DB_PATH = Path(__file__).resolve().parents[1] / "data" / "gold" / "football_dw.duckdb"
+
+# where optionally restricts the checked child rows (a SQL predicate on the
+# child, aliased c), e.g. to the rows an incremental run wrote.
+@dataclass(frozen=True)
+class ForeignKey:
+    child: str
+    child_col: str
+    parent: str
+    parent_col: str
+    where: str | None = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.child}.{self.child_col} -> {self.parent}.{self.parent_col}"
+
+@dataclass
+class FKResult:
+    fk: ForeignKey
+    violations: int
+    sample: list = field(default_factory=list)
+
+    @property
+    def passed(self) -> bool:
+        return self.violations == 0
+
+# Star schema relationships of the gold layer
+WAREHOUSE_FKS = [
+    ForeignKey("fact_match", "home_team_sk", "dim_team", "team_sk"),
+    ForeignKey("fact_match", "away_team_sk", "dim_team", "team_sk"),
+    ForeignKey("fact_match", "match_date", "dim_date", "match_date"),
+    ForeignKey("fact_player_match", "match_id", "fact_match", "match_id"),
+    ForeignKey("fact_player_match", "player_id", "dim_player", "player_id"),
+    ForeignKey("fact_player_match", "team_sk", "dim_team", "team_sk"),
+    ForeignKey("fact_team_match", "match_id", "fact_match", "match_id"),
+    ForeignKey("fact_team_match", "team_sk", "dim_team", "team_sk"),
+    ForeignKey("fact_team_match", "opponent_sk", "dim_team", "team_sk"),
+    ForeignKey("agg_player_season", "player_id", "dim_player", "player_id"),
+    ForeignKey("agg_player_season", "team_sk", "dim_team", "team_sk"),
+    ForeignKey("dim_player_history", "player_id", "dim_player", "player_id"),
+    ForeignKey("dim_player_history", "team_sk", "dim_team", "team_sk"),
+]
+
+# Count child rows whose non-NULL key is missing from the parent, plus a
+# sample of the missing keys. child/parent can be any DuckDB relation.
+def check_foreign_key(
+    con: duckdb.DuckDBPyConnection,
+    fk: ForeignKey,
+    sample_size: int = 5,
+) -> FKResult:
+    anti_join = f"""
+        FROM {fk.child} c
+        ANTI JOIN {fk.parent} p ON p."{fk.parent_col}" = c."{fk.child_col}"
+        WHERE c."{fk.child_col}" IS NOT NULL{f" AND ({fk.where})" if fk.where else ""}
+    """
+    violations = con.execute(f"SELECT COUNT(*) {anti_join}").fetchone()[0]
+    if not violations:
+        return FKResult(fk, 0)
+    rows = con.execute(
+        f'SELECT DISTINCT c."{fk.child_col}" {anti_join} LIMIT {sample_size}'
+    ).fetchall()
+    return FKResult(fk, violations, [r[0] for r in rows])
+
+# The relationships with the child rows of some tables restricted by a
+# predicate (child table -> predicate, see ForeignKey.where).
+def scoped_fks(scopes: dict[str, str], fks: list[ForeignKey] = WAREHOUSE_FKS) -> list[ForeignKey]:
+    return [replace(fk, where=scopes[fk.child]) if fk.child in scopes else fk for fk in fks]
+
+# Check every warehouse relationship; raises with all failures.
+def check_warehouse_integrity(
+    con: duckdb.DuckDBPyConnection,
+    fks: list[ForeignKey] = WAREHOUSE_FKS,
+) -> list[FKResult]:
+    results = [check_foreign_key(con, fk) for fk in fks]
+    failed = [r for r in results if not r.passed]
+    if failed:
+        details = "; ".join(f"{r.fk.name}: {r.violations} rows, e.g. {r.sample}" for r in failed)
+        raise ValueError(f"Referential integrity failed in warehouse: {details}")
+    return results
+
+# Full check of an existing warehouse (incremental runs only check the rows
+# they wrote):
+#   python src/integrity.py
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check every foreign key of the gold warehouse")
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    args = parser.parse_args()
+
+    con = duckdb.connect(str(args.db), read_only=True)
+    for result in check_warehouse_integrity(con):
+        print(f"{result.fk.name}: OK")
+    con.close()
@@ -1,44 +1,82 @@
 from __future__ import annotations
-from pathlib import Path
-import duckdb
-
-def build_kpis(db_path: Path) -> None:
-    # Connect to the analytical DuckDB database
-    con = duckdb.connect(str(db_path))
-
-    # Create KPI table (idempotent)
-    con.execute("CREATE OR REPLACE TABLE gold_kpis(kpi VARCHAR, value DOUBLE)")
-
-    # Create KPI table (idempotent)
-    con.execute("""
-        INSERT INTO gold_kpis
-        SELECT 'avg_total_goals_per_match', AVG(home_goals + away_goals)::DOUBLE
-        FROM fact_match
-        WHERE home_goals IS NOT NULL AND away_goals IS NOT NULL
-    """)
+from session import Session
+
+# KPI history: one row per KPI, run and grain. grain is 'all' for the value
+# over all data (also published in gold_kpis) or 'season_league' for the
+# value of one season/league.
+KPI_HISTORY_TABLE = "gold_kpi_history"
 
+# KPI name -> aggregate, grouped by the fact table they are computed from.
+# All KPIs of a fact table are evaluated in a single scan.
+MATCH_KPIS = {
     # Average total goals per match
-    con.execute("""
-        INSERT INTO gold_kpis
-        SELECT 'avg_attendance', AVG(attendance)::DOUBLE
-        FROM fact_match
-        WHERE attendance IS NOT NULL
-    """)
+    "avg_total_goals_per_match": "AVG(home_goals + away_goals)",
+    # Average attendance
+    "avg_attendance": "AVG(attendance)",
+}
 
+PLAYER_KPIS = {
     # Average player performance rating
-    con.execute("""
-        INSERT INTO gold_kpis
-        SELECT 'avg_player_rating', AVG(rating)::DOUBLE
-        FROM fact_player_match
-        WHERE rating IS NOT NULL
-    """)
-
+    "avg_player_rating": "AVG(rating)",
     # Average minutes played per player-match
-    con.execute("""
-        INSERT INTO gold_kpis
-        SELECT 'avg_minutes_played', AVG(minutes)::DOUBLE
-        FROM fact_player_match
-        WHERE minutes IS NOT NULL
+    "avg_minutes_played": "AVG(minutes)",
+}
+
+# Player facts get the season/league of their match
+KPI_SOURCES = {
+    "fact_match": (MATCH_KPIS, "fact_match"),
+    "fact_player_match": (PLAYER_KPIS, """
+        (SELECT p.*, m.season, m.league
+         FROM fact_player_match p
+         LEFT JOIN fact_match m ON m.match_id = p.match_id)
+    """),
+}
+
+def ensure_kpi_history(session: Session) -> None:
+    session.con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {KPI_HISTORY_TABLE}(
+            run_id VARCHAR,
+            computed_at TIMESTAMP,
+            grain VARCHAR,
+            season VARCHAR,
+            league VARCHAR,
+            kpi VARCHAR,
+            value DOUBLE
+        )
     """)
 
-    con.close()
\ No newline at end of file
+# Append the KPIs of this run to the history (overall and per season/league)
+# and publish the overall values in gold_kpis.
+def build_kpis(session: Session) -> None:
+    # Use the shared analytical DuckDB connection
+    con = session.con
+    ensure_kpi_history(session)
+
+    with session.transaction():
+        # Reruns within the same run id replace their rows
+        con.execute(f"DELETE FROM {KPI_HISTORY_TABLE} WHERE run_id = ?", [session.run_id])
+
+        for kpis, relation in KPI_SOURCES.values():
+            aggregates = ", ".join(f"{expr}::DOUBLE AS {name}" for name, expr in kpis.items())
+            con.execute(f"""
+                INSERT INTO {KPI_HISTORY_TABLE}
+                SELECT ?, NOW()::TIMESTAMP, grain, season, league, kpi, value
+                FROM (
+                    SELECT
+                        CASE WHEN GROUPING(season, league) = 3 THEN 'all' ELSE 'season_league' END AS grain,
+                        season,
+                        league,
+                        {aggregates}
+                    FROM {relation}
+                    GROUP BY GROUPING SETS ((), (season, league))
+                )
+                UNPIVOT INCLUDE NULLS (value FOR kpi IN ({", ".join(kpis)}))
+            """, [session.run_id])
+
+        # Create KPI table (idempotent)
+        con.execute(f"""
+            CREATE OR REPLACE TABLE gold_kpis AS
+            SELECT kpi, value
+            FROM {KPI_HISTORY_TABLE}
+            WHERE run_id = ? AND grain = 'all'
+        """, [session.run_id])
@@ -0,0 +1,136 @@
+from __future__ import annotations
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+import duckdb
+import pandas as pd
+from session import Session
+from transform_sql import load_staging_sql
+from dw import build_dw, cluster_facts, index_facts
+from synthetic import generate
+
+# Physical layout benchmark: builds a warehouse from synthetic bronze files
+# and times typical fact queries (one season, a date range, one player, one
+# match) with the facts in three layouts:
+#   unclustered  rows in arbitrary order, as plain CREATE TABLE AS joins wrote them
+#   clustered    rows sorted by dw.FACT_CLUSTER_KEYS (the gold build default)
+#   indexed      clustered plus the ART indexes of dw.index_facts
+# Rows scanned come from DuckDB's profiler: the rows the min-max zone maps
+# and indexes did not let the scans skip. One JSON line per layout and query
+# is appended to the results file.
+BASE_DIR = Path(__file__).resolve().parents[1]
+RESULTS = BASE_DIR / "data" / "benchmarks" / "layout.jsonl"
+SCALE = 2000
+REPEATS = 5
+LAYOUTS = ("unclustered", "clustered", "indexed")
+
+QUERIES = {
+    "season": """
+        SELECT COUNT(*), SUM(home_goals + away_goals) FROM fact_match WHERE season = $season
+    """,
+    "date_range": """
+        SELECT COUNT(*), AVG(attendance) FROM fact_match
+        WHERE match_date BETWEEN $date_from AND $date_from + INTERVAL 30 DAY
+    """,
+    "player": """
+        SELECT COUNT(*), SUM(goals), AVG(rating) FROM fact_player_match WHERE player_id = $player_id
+    """,
+    "match": "SELECT * FROM fact_match WHERE match_id = $match_id",
+}
+
+# Filter values picked from the middle of the data, so they exist at any scale
+def query_params(con: duckdb.DuckDBPyConnection) -> dict[str, object]:
+    row = con.execute("""
+        SELECT
+            (SELECT MEDIAN(season) FROM fact_match),
+            (SELECT MEDIAN(match_date) FROM fact_match),
+            (SELECT MEDIAN(player_id) FROM fact_player_match),
+            (SELECT MEDIAN(match_id) FROM fact_match)
+    """).fetchone()
+    return dict(zip(("season", "date_from", "player_id", "match_id"), row))
+
+# Put the facts in the given layout (applied in LAYOUTS order)
+def apply_layout(session: Session, layout: str) -> None:
+    if layout == "unclustered":
+        con = session.con
+        for table in ("fact_match", "fact_player_match"):
+            con.execute(f"CREATE OR REPLACE TABLE {table} AS SELECT * FROM {table} ORDER BY hash(match_id)")
+    elif layout == "clustered":
+        cluster_facts(session)
+    else:
+        index_facts(session)
+
+# Median wall time over REPEATS runs (after one warm-up run) and rows
+# scanned by the last run.
+def time_query(con: duckdb.DuckDBPyConnection, sql: str, params: dict[str, object]) -> dict:
+    names = {p for p in params if f"${p}" in sql}
+    bound = {p: params[p] for p in names}
+    con.execute(sql, bound).fetchall()
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        con.execute(sql, bound).fetchall()
+        times.append(time.perf_counter() - start)
+    profile = json.loads(con.get_profiling_information(format="json"))
+    return {
+        "ms_median": round(statistics.median(times) * 1000, 3),
+        "rows_scanned": profile["cumulative_rows_scanned"],
+    }
+
+def bench_layouts(work_dir: Path, scale: float, seed: int = 0) -> list[dict]:
+    matches_csv, stats_csv = generate(work_dir / "bronze", scale, seed)
+    results = []
+    with Session(work_dir / "bench.duckdb") as session:
+        load_staging_sql([matches_csv], [stats_csv], session)
+        build_dw(session)
+        con = session.con
+        params = query_params(con)
+        table_rows = dict(con.execute("""
+            SELECT 'fact_match', COUNT(*) FROM fact_match
+            UNION ALL
+            SELECT 'fact_player_match', COUNT(*) FROM fact_player_match
+        """).fetchall())
+
+        for layout in LAYOUTS:
+            apply_layout(session, layout)
+            con.execute("PRAGMA enable_profiling = 'no_output'")
+            for name, sql in QUERIES.items():
+                table = "fact_player_match" if "fact_player_match" in sql else "fact_match"
+                results.append({
+                    "layout": layout,
+                    "query": name,
+                    "table_rows": table_rows[table],
+                    **time_query(con, sql, params),
+                })
+            con.execute("PRAGMA disable_profiling")
+    return results
+
+def main(scale: float = SCALE, seed: int = 0, results_path: Path = RESULTS) -> list[dict]:
+    run_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    with tempfile.TemporaryDirectory() as tmp:
+        records = [
+            {"run_at": run_at, "scale": scale, **record, "duckdb": duckdb.__version__}
+            for record in bench_layouts(Path(tmp), scale, seed)
+        ]
+
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(results_path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+    df = pd.DataFrame(records)
+    print(df[["query", "layout", "table_rows", "rows_scanned", "ms_median"]].to_string(index=False))
+    print(f"\nResults appended to {results_path}")
+    return records
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fact table layout benchmark (zone maps and indexes)")
+    parser.add_argument("--scale", type=float, default=SCALE, help="multiple of the sample dataset size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--results", type=Path, default=RESULTS, help="JSON lines file to append to")
+    args = parser.parse_args()
+    main(args.scale, args.seed, args.results)
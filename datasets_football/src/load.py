@@ -1,19 +1,49 @@
 from __future__ import annotations
-from pathlib import Path
 import pandas as pd
-import duckdb
+from session import Session
+from schema import PROVENANCE_SCHEMA, STG_MATCHES_SCHEMA, STG_PLAYER_STATS_SCHEMA, typed_select
 
-def load_staging(matches: pd.DataFrame, stats: pd.DataFrame, db_path: Path) -> None:
-    # Ensure target directory exists
-    db_path.parent.mkdir(parents=True, exist_ok=True)
+def load_staging(matches: pd.DataFrame, stats: pd.DataFrame, session: Session) -> None:
+    # Register in-memory DataFrames on the shared connection
+    con = session.con
+    con.register("matches_df", matches)
+    con.register("stats_df", stats)
+
+    # Create or replace staging tables with the declared silver types
+    con.execute(f"""
+        CREATE OR REPLACE TABLE stg_matches AS
+        SELECT {typed_select(list(matches.columns), STG_MATCHES_SCHEMA)} FROM matches_df
+    """)
+    con.execute(f"""
+        CREATE OR REPLACE TABLE stg_player_stats AS
+        SELECT {typed_select(list(stats.columns), STG_PLAYER_STATS_SCHEMA)} FROM stats_df
+    """)
+
+    con.unregister("matches_df")
+    con.unregister("stats_df")
 
-    # Connect to DuckDB and register in-memory DataFrames
-    con = duckdb.connect(str(db_path))
+# Upsert a delta into the staging tables: rows of the affected matches are
+# replaced, everything else in staging is left untouched.
+def upsert_staging(
+    matches: pd.DataFrame,
+    stats: pd.DataFrame,
+    match_ids: set[str],
+    session: Session,
+) -> None:
+    con = session.con
     con.register("matches_df", matches)
     con.register("stats_df", stats)
+    con.register("delta_ids_df", pd.DataFrame({"match_id": sorted(match_ids)}))
 
-    # Create or replace staging tables
-    con.execute("CREATE OR REPLACE TABLE stg_matches AS SELECT * FROM matches_df")
-    con.execute("CREATE OR REPLACE TABLE stg_player_stats AS SELECT * FROM stats_df")
+    with session.transaction():
+        # Staging built before provenance columns existed gets them (NULL for old rows)
+        for table in ("stg_matches", "stg_player_stats"):
+            for col, col_type in PROVENANCE_SCHEMA.items():
+                con.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {col} {col_type}")
+        con.execute("DELETE FROM stg_matches WHERE match_id IN (SELECT match_id FROM delta_ids_df)")
+        con.execute("DELETE FROM stg_player_stats WHERE match_id IN (SELECT match_id FROM delta_ids_df)")
+        con.execute("INSERT INTO stg_matches BY NAME SELECT * FROM matches_df")
+        con.execute("INSERT INTO stg_player_stats BY NAME SELECT * FROM stats_df")
 
-    con.close()
\ No newline at end of file
+    for name in ("matches_df", "stats_df", "delta_ids_df"):
+        con.unregister(name)
@@ -0,0 +1,172 @@
+from __future__ import annotations
+import json
+import logging
+import sys
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from session import Session
+
+# Per-stage instrumentation of pipeline runs.
+# Every stage emits one JSON log line and one row in pipeline_runs with its
+# duration, row counts, the peak memory of the process so far and the row
+# counts of the DuckDB tables it wrote. The on-disk size of those tables is filled in
+# at the end of the run (see record_table_sizes).
+METRICS_TABLE = "pipeline_runs"
+
+@dataclass
+class StageRun:
+    run_id: str
+    stage: str
+    started_at: str
+    seconds: float = 0.0
+    rows_in: int | None = None
+    rows_out: int | None = None
+    # Peak RSS of the process since it started, read at the end of the
+    # stage: a high-water mark over the whole run, not the stage's own usage
+    process_peak_rss_mb: float | None = None
+    tables: dict[str, int] = field(default_factory=dict)
+    # Bytes of the database file the tables occupy at the end of the run
+    table_bytes: dict[str, int] = field(default_factory=dict)
+    status: str = "ok"
+
+# Peak resident set size of this process so far, in MB (None when it cannot
+# be measured: resource is POSIX only, psutil is optional on Windows).
+def peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 2**20
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, in KB elsewhere
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+def ensure_metrics_table(session: Session) -> None:
+    session.con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {METRICS_TABLE}(
+            run_id VARCHAR,
+            stage VARCHAR,
+            started_at TIMESTAMP,
+            seconds DOUBLE,
+            rows_in BIGINT,
+            rows_out BIGINT,
+            process_peak_rss_mb DOUBLE,
+            tables VARCHAR,
+            status VARCHAR,
+            table_bytes VARCHAR
+        )
+    """)
+    # Tables created by earlier versions: add table_bytes (NULL for their
+    # runs), and name the process-wide peak RSS as such
+    session.con.execute(f"ALTER TABLE {METRICS_TABLE} ADD COLUMN IF NOT EXISTS table_bytes VARCHAR")
+    legacy = session.con.execute(
+        "SELECT COUNT(*) FROM information_schema.columns WHERE table_name = ? AND column_name = 'peak_rss_mb'",
+        [METRICS_TABLE],
+    ).fetchone()[0]
+    if legacy:
+        session.con.execute(f"ALTER TABLE {METRICS_TABLE} RENAME COLUMN peak_rss_mb TO process_peak_rss_mb")
+
+# Instrument one stage:
+#   with stage(session, "transform", rows_in=n) as run:
+#       ...
+#       run.rows_out = len(result)
+# tables are the DuckDB tables the stage writes; their row counts are
+# recorded, and rows_out defaults to their total when not set by the stage.
+# A failing stage is recorded with status 'failed' and the error re-raised.
+@contextmanager
+def stage(
+    session: Session,
+    name: str,
+    rows_in: int | None = None,
+    tables: tuple[str, ...] = (),
+) -> Iterator[StageRun]:
+    run = StageRun(session.run_id, name, datetime.now().isoformat(sep=" "), rows_in=rows_in)
+    start = time.perf_counter()
+    try:
+        yield run
+    except BaseException:
+        run.status = "failed"
+        raise
+    finally:
+        run.seconds = round(time.perf_counter() - start, 6)
+        run.process_peak_rss_mb = peak_rss_mb()
+        if run.status == "ok":
+            run.tables = table_rows(session, tables)
+            if run.rows_out is None and run.tables:
+                run.rows_out = sum(run.tables.values())
+        _record(session, run)
+
+# Row counts of the given tables that exist. Counted rather than read from
+# the catalog, whose estimates lag behind inside an open transaction.
+def table_rows(session: Session, tables: tuple[str, ...]) -> dict[str, int]:
+    existing = [t for t in tables if session.table_exists(t)]
+    if not existing:
+        return {}
+    rows = session.con.execute(
+        " UNION ALL ".join(f"SELECT '{t}', COUNT(*) FROM {t}" for t in existing)
+    ).fetchall()
+    return dict(rows)
+
+# Bytes of the database file occupied by the given tables: the blocks their
+# column segments are stored in, so sizes are rounded up to whole blocks
+# (256 KB by default). Only data written to the file by a checkpoint has
+# blocks.
+def table_bytes(session: Session, tables: list[str]) -> dict[str, int]:
+    existing = [t for t in tables if session.table_exists(t)]
+    if not existing:
+        return {}
+    block_size = session.con.execute("SELECT block_size FROM pragma_database_size()").fetchone()[0]
+    rows = session.con.execute(" UNION ALL ".join(f"""
+        SELECT '{t}', COUNT(DISTINCT block_id) FILTER (WHERE block_id >= 0)
+            + COALESCE(SUM(len(additional_block_ids)), 0)
+        FROM pragma_storage_info('{t}')
+    """ for t in existing)).fetchall()
+    return {t: int(blocks) * block_size for t, blocks in rows}
+
+# Fill in table_bytes of the stages of this run. Stages mostly run inside a
+# transaction, whose tables have no blocks yet, so the sizes are measured
+# once at the end of the run, after a checkpoint.
+def record_table_sizes(session: Session) -> dict[str, int]:
+    con = session.con
+    ensure_metrics_table(session)
+    runs = con.execute(
+        f"SELECT stage, started_at, tables FROM {METRICS_TABLE} WHERE run_id = ? AND status = 'ok'",
+        [session.run_id],
+    ).fetchall()
+    written = [(stage_name, started_at, list(json.loads(tables or "{}"))) for stage_name, started_at, tables in runs]
+    con.execute("CHECKPOINT")
+    sizes = table_bytes(session, sorted({t for _, _, tables in written for t in tables}))
+
+    for stage_name, started_at, tables in written:
+        if tables:
+            con.execute(
+                f"UPDATE {METRICS_TABLE} SET table_bytes = ? WHERE run_id = ? AND stage = ? AND started_at = ?",
+                [json.dumps({t: sizes[t] for t in tables if t in sizes}), session.run_id, stage_name, started_at],
+            )
+    logging.info(json.dumps({"event": "table_sizes", "run_id": session.run_id, "table_bytes": sizes}))
+    return sizes
+
+def _record(session: Session, run: StageRun) -> None:
+    record = asdict(run)
+    logging.info(json.dumps({"event": "stage", **record}))
+
+    # A failed stage may have aborted the open transaction, only log it then
+    if run.status == "failed" and session.in_transaction:
+        return
+    ensure_metrics_table(session)
+    session.con.execute(
+        f"""
+        INSERT INTO {METRICS_TABLE}
+            (run_id, stage, started_at, seconds, rows_in, rows_out, process_peak_rss_mb, tables, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [run.run_id, run.stage, run.started_at, run.seconds, run.rows_in, run.rows_out,
+         run.process_peak_rss_mb, json.dumps(run.tables), run.status],
+    )
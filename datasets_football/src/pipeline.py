@@ -1,43 +1,565 @@
 from __future__ import annotations
+import argparse
+from collections.abc import Callable
 import logging
 from pathlib import Path
+import pandas as pd
 from logging_config import setup_logging
 from extract import extract_matches, extract_player_stats
 from transform import transform
 from data_quality import data_quality
-from load import load_staging
-from dw import build_dw
-from kpis import build_kpis
-from views import build_business_views
+from load import load_staging, upsert_staging
+from dw import DW_TABLES, build_dw, cluster_facts, index_facts, update_dw
+from kpis import KPI_HISTORY_TABLE, build_kpis
+from cube import CUBE_TABLE, build_cube, cube_keys, update_cube
+from views import (
+    BUSINESS_VIEWS,
+    build_business_views,
+    materialize_views,
+    views_materialized,
+    refresh_business_views,
+    touched_keys,
+)
+from streaming import stream_to_staging
+from transform_sql import load_staging_sql
+from sharding import load_staging_sharded
+from silver import discard_silver, publish_silver, silver_exists, silver_relation, stage_silver, write_silver
+from session import Session
+from metrics import record_table_sizes, stage
+from stage_cache import StageCache, clear_cache
+from bronze import Bronze, bronze_fingerprint, fingerprint_bronze, read_bronze, resolve_bronze
+from incremental import (
+    Watermark,
+    changed_files,
+    read_watermarks,
+    select_delta,
+    staged_seasons,
+    staged_watermark,
+    write_watermarks,
+)
 
 # Paths (keep centralized here)
 BASE_DIR = Path(__file__).resolve().parents[1]
 BRONZE = BASE_DIR / "data" / "bronze"
+SILVER = BASE_DIR / "data" / "silver"
 GOLD = BASE_DIR / "data" / "gold"
 DB_PATH = GOLD / "football_dw.duckdb"
 
 MATCHES_CSV = BRONZE / "futbol_matches.csv"
 STATS_CSV = BRONZE / "futbol_player_stats.csv"
+# Default bronze sources; --matches/--stats select other files, directories
+# or globs (see bronze.py)
+DEFAULT_BRONZE = Bronze((MATCHES_CSV,), (STATS_CSV,))
 
-def main() -> None:
-    setup_logging(BASE_DIR)
-    logging.info("START pipeline")
+ENGINES = ("pandas", "duckdb")
+
+# Tables written by each instrumented stage (see metrics.stage)
+STAGING_TABLES = ("stg_matches", "stg_player_stats")
+KPI_TABLES = ("gold_kpis", KPI_HISTORY_TABLE)
+CUBE_TABLES = (CUBE_TABLE,)
+VIEW_TABLES = tuple(view.table for view in BUSINESS_VIEWS)
+VIEW_NAMES = tuple(view.name for view in BUSINESS_VIEWS)
+
+# Gold build from the staging tables, as one transaction so readers never
+# see a half-built warehouse.
+# With dw_workers > 1 the warehouse tables are built concurrently (see
+# dw.build_dw); that build swaps its tables in atomically on its own, so only
+# the KPIs, cube and views share the closing transaction.
+# With a cache, only the gold stages whose key changed are rebuilt.
+def build_gold(session: Session, dw_workers: int = 1, cache: StageCache | None = None) -> None:
+    todo = ["dw", "kpis", "cube", "views"]
+    if cache is not None:
+        cache.key("dw")
+        cache.key("kpis")
+        cache.key("cube")
+        cache.key("views", str(views_materialized(session)))
+        outputs = {"dw": DW_TABLES, "kpis": KPI_TABLES, "cube": CUBE_TABLES, "views": VIEW_NAMES}
+        todo = [s for s in todo if not cache.fresh(s, outputs[s])]
+        if len(todo) < len(outputs):
+            logging.info("Gold stages unchanged since last run, skipped: %s",
+                         [s for s in outputs if s not in todo])
+
+    if "dw" in todo and dw_workers > 1:
+        with stage(session, "dw", tables=DW_TABLES):
+            build_dw(session, workers=dw_workers)
+    with session.transaction():
+        if "dw" in todo and dw_workers <= 1:
+            with stage(session, "dw", tables=DW_TABLES):
+                build_dw(session)
+        if "kpis" in todo:
+            with stage(session, "kpis", tables=KPI_TABLES):
+                build_kpis(session)
+        if "cube" in todo:
+            with stage(session, "cube", tables=CUBE_TABLES):
+                build_cube(session)
+        if "views" in todo:
+            with stage(session, "views", tables=VIEW_TABLES):
+                build_business_views(session)
+
+    if cache is not None and todo:
+        cache.store(*todo)
+
+# Whether the silver stages of a full run can be skipped: bronze content and
+# silver code unchanged since the last cached run, staging and silver files
+# still in place. Also computes the silver key the gold keys chain from.
+# bronze carries its file fingerprints (see bronze.fingerprint_bronze).
+def silver_cached(session: Session, cache: StageCache | None, mode: str, bronze: Bronze) -> bool:
+    if cache is None:
+        return False
+    cache.key(
+        "silver",
+        bronze_fingerprint(bronze.matches, bronze.matches_files),
+        bronze_fingerprint(bronze.stats, bronze.stats_files),
+        mode,
+    )
+    if cache.fresh("silver", STAGING_TABLES) and silver_exists(SILVER):
+        logging.info("Bronze files and silver code unchanged since last run, silver stages skipped")
+        return True
+    return False
+
+# compact selects the memory-compact silver dtypes of the pandas engine
+# (see transform.compact_dtypes); shard_workers > 0 runs its silver step
+# sharded by season/league (see run_sharded).
+def run_full(
+    session: Session,
+    engine: str = "pandas",
+    dw_workers: int = 1,
+    compact: bool = False,
+    cache: StageCache | None = None,
+    bronze: Bronze = DEFAULT_BRONZE,
+    shard_workers: int = 0,
+) -> None:
+    bronze = fingerprint_bronze(bronze)
+    if engine == "duckdb":
+        run_full_sql(session, dw_workers, cache, bronze)
+        return
+    if shard_workers > 0:
+        run_sharded(session, shard_workers, dw_workers, compact, cache, bronze)
+        return
+    if silver_cached(session, cache, "pandas", bronze):
+        build_gold(session, dw_workers, cache)
+        return
 
     # Extract raw datasets
-    matches_raw = extract_matches(MATCHES_CSV)
-    stats_raw = extract_player_stats(STATS_CSV)
+    with stage(session, "extract") as run:
+        matches_raw = read_bronze(bronze.matches, extract_matches, bronze.workers)
+        stats_raw = read_bronze(bronze.stats, extract_player_stats, bronze.workers)
+        run.rows_out = len(matches_raw) + len(stats_raw)
 
     # Transform and validate data
-    matches, stats = transform(matches_raw, stats_raw)
-    data_quality(matches, stats)
+    with stage(session, "transform", rows_in=run.rows_out) as run:
+        matches, stats = transform(matches_raw, stats_raw, compact)
+        run.rows_out = len(matches) + len(stats)
+    with stage(session, "data_quality", rows_in=run.rows_out):
+        report = data_quality(matches, stats)
+    logging.info("Data quality OK: %d rules checked", len(report.results))
+
+    # Load data, persist silver and build analytical layer
+    with stage(session, "load", rows_in=run.rows_out, tables=STAGING_TABLES):
+        load_staging(matches, stats, session)
+    with stage(session, "silver"):
+        write_silver(session, SILVER)
+    build_gold(session, dw_workers, cache)
+
+    write_watermarks(session, [
+        Watermark("matches", bronze_fingerprint(bronze.matches, bronze.matches_files), len(matches),
+                  bronze.matches_files),
+        Watermark("player_stats", bronze_fingerprint(bronze.stats, bronze.stats_files), len(stats),
+                  bronze.stats_files),
+    ])
+    if cache is not None:
+        cache.store("silver")
+
+# Full run with the DuckDB silver engine: CSV -> SQL cleaning -> staging,
+# without materialising the data in pandas.
+def run_full_sql(
+    session: Session,
+    dw_workers: int = 1,
+    cache: StageCache | None = None,
+    bronze: Bronze = DEFAULT_BRONZE,
+) -> None:
+    bronze = fingerprint_bronze(bronze)
+    if silver_cached(session, cache, "duckdb", bronze):
+        build_gold(session, dw_workers, cache)
+        return
+
+    with stage(session, "load", tables=STAGING_TABLES):
+        load_staging_sql(bronze.matches, bronze.stats, session)
+    with stage(session, "silver"):
+        write_silver(session, SILVER)
+    build_gold(session, dw_workers, cache)
+    write_staged_watermarks(session, bronze)
+    if cache is not None:
+        cache.store("silver")
+
+# Full run with the pandas silver step split into season/league shards,
+# packed into one batch per shard_workers process and merged into staging
+# (see sharding.py). Stages the same rows as run_full.
+def run_sharded(
+    session: Session,
+    shard_workers: int,
+    dw_workers: int = 1,
+    compact: bool = False,
+    cache: StageCache | None = None,
+    bronze: Bronze = DEFAULT_BRONZE,
+) -> None:
+    bronze = fingerprint_bronze(bronze)
+    if silver_cached(session, cache, "sharded", bronze):
+        build_gold(session, dw_workers, cache)
+        return
+
+    with stage(session, "load", tables=STAGING_TABLES):
+        shards = load_staging_sharded(bronze, session, shard_workers, compact)
+    logging.info("Staged %d season/league shards with %d workers", shards, shard_workers)
+
+    with stage(session, "silver"):
+        write_silver(session, SILVER)
+    build_gold(session, dw_workers, cache)
+    write_staged_watermarks(session, bronze)
+    if cache is not None:
+        cache.store("silver")
+
+# Streaming run: the silver step is done chunk by chunk straight into staging.
+def run_streaming(
+    session: Session,
+    chunksize: int,
+    dw_workers: int = 1,
+    cache: StageCache | None = None,
+    bronze: Bronze = DEFAULT_BRONZE,
+) -> None:
+    bronze = fingerprint_bronze(bronze)
+    if silver_cached(session, cache, "streaming", bronze):
+        build_gold(session, dw_workers, cache)
+        return
+
+    with stage(session, "load", tables=STAGING_TABLES):
+        n_matches, n_stats = stream_to_staging(bronze.matches, bronze.stats, session, chunksize)
+    logging.info("Streamed %d matches and %d player rows into staging", n_matches, n_stats)
+
+    with stage(session, "silver"):
+        write_silver(session, SILVER)
+    build_gold(session, dw_workers, cache)
+    write_staged_watermarks(session, bronze)
+    if cache is not None:
+        cache.store("silver")
+
+# bronze carries its file fingerprints (see bronze.fingerprint_bronze).
+def write_staged_watermarks(session: Session, bronze: Bronze) -> None:
+    write_watermarks(session, [
+        staged_watermark(session, "matches", "stg_matches",
+                         bronze_fingerprint(bronze.matches, bronze.matches_files), bronze.matches_files),
+        staged_watermark(session, "player_stats", "stg_player_stats",
+                         bronze_fingerprint(bronze.stats, bronze.stats_files), bronze.stats_files),
+    ])
 
-    # Load data and build analytical layer
-    load_staging(matches, stats, DB_PATH)
-    build_dw(DB_PATH)
-    build_kpis(DB_PATH)
-    build_business_views(DB_PATH)
+# Rows of the changed bronze files of a source; without any, an empty frame
+# shaped like its staging table.
+def read_changed(
+    session: Session,
+    files: list[Path],
+    reader: Callable[[Path], pd.DataFrame],
+    table: str,
+    workers: int = 1,
+) -> pd.DataFrame:
+    if files:
+        return read_bronze(files, reader, workers)
+    return session.con.execute(f"SELECT * FROM {table} LIMIT 0").df()
+
+# Incremental run: only the bronze files changed since the last run are read,
+# and only rows of new or changed matches are transformed, validated and
+# upserted into staging and the fact tables.
+def run_incremental(session: Session, compact: bool = False, bronze: Bronze = DEFAULT_BRONZE) -> None:
+    bronze = fingerprint_bronze(bronze)
+    matches_files, stats_files = bronze.matches_files, bronze.stats_files
+    watermarks = read_watermarks(session)
+    matches_wm = watermarks.get("matches")
+    stats_wm = watermarks.get("player_stats")
+    matches_changed = changed_files(bronze.matches, matches_files, matches_wm)
+    stats_changed = changed_files(bronze.stats, stats_files, stats_wm)
+
+    # Skip everything when no bronze file changed since the last run
+    if not matches_changed and not stats_changed:
+        logging.info("Bronze files unchanged since last run, nothing to load")
+        return
+    logging.info("Changed bronze files: %d of %d matches, %d of %d player stats",
+                 len(matches_changed), len(bronze.matches), len(stats_changed), len(bronze.stats))
+
+    # The warehouse is about to change outside of the full-run stage cache
+    clear_cache(session.db_path)
+
+    with stage(session, "extract") as run:
+        matches_raw = read_changed(session, matches_changed, extract_matches, "stg_matches", bronze.workers)
+        stats_raw = read_changed(session, stats_changed, extract_player_stats, "stg_player_stats", bronze.workers)
+        run.rows_out = len(matches_raw) + len(stats_raw)
+
+    # Clean the changed files, keep the matches whose content differs from staging
+    reread = {
+        "stg_matches": [path.name for path in matches_changed],
+        "stg_player_stats": [path.name for path in stats_changed],
+    }
+    with stage(session, "transform", rows_in=run.rows_out) as run:
+        matches, stats = transform(matches_raw, stats_raw, compact)
+        matches, stats, match_ids = select_delta(matches, stats, reread, session)
+        run.rows_out = len(matches) + len(stats)
+    logging.info("Incremental delta: %d matches, %d player rows", len(matches), len(stats))
+
+    # Staging, gold and the watermarks are committed together: after a failure
+    # they all still reflect the previous run, and the next run retries the
+    # same delta. The touched silver partitions are staged during the
+    # transaction and only replace the silver ones once it has committed.
+    seasons = set()
+    try:
+        with session.transaction():
+            if match_ids:
+                with stage(session, "data_quality", rows_in=run.rows_out):
+                    data_quality(matches, stats, allow_empty=True)
+
+                # Upsert delta, rewrite the touched silver partitions and refresh the analytical layer
+                seasons = staged_seasons(session, match_ids) | set(matches["season"].dropna())
+                with stage(session, "load", rows_in=run.rows_out, tables=STAGING_TABLES):
+                    upsert_staging(matches, stats, match_ids, session)
+                with stage(session, "silver"):
+                    stage_silver(session, SILVER, sorted(seasons))
+                previous_keys = touched_keys(session, match_ids)
+                previous_cells = cube_keys(session.con, match_ids)
+                with stage(session, "dw", rows_in=len(match_ids), tables=DW_TABLES):
+                    update_dw(session, match_ids)
+                with stage(session, "kpis", tables=KPI_TABLES):
+                    build_kpis(session)
+                with stage(session, "cube", tables=CUBE_TABLES):
+                    update_cube(session, match_ids, previous_cells)
+                with stage(session, "views", tables=VIEW_TABLES):
+                    refresh_business_views(session, match_ids, previous_keys)
+
+            write_watermarks(session, [
+                Watermark("matches", bronze_fingerprint(bronze.matches, matches_files), len(matches), matches_files),
+                Watermark("player_stats", bronze_fingerprint(bronze.stats, stats_files), len(stats), stats_files),
+            ])
+        if seasons:
+            publish_silver(SILVER, sorted(seasons))
+    finally:
+        discard_silver(SILVER)
+
+# Gold build straight from the Parquet silver layer, no CSV parsing.
+# With seasons, only those partitions are read and only their facts are
+# replaced (backfill); otherwise the whole warehouse is rebuilt from silver.
+def run_from_silver(
+    session: Session,
+    seasons: list[str] | None = None,
+    dw_workers: int = 1,
+) -> None:
+    if not silver_exists(SILVER):
+        raise FileNotFoundError(f"No silver layer found at {SILVER}, run a full load first")
+    clear_cache(session.db_path)
+
+    matches = silver_relation(SILVER, "matches", seasons)
+    stats = silver_relation(SILVER, "player_stats", seasons)
+
+    if not seasons and dw_workers > 1:
+        with stage(session, "dw", tables=DW_TABLES):
+            build_dw(session, matches, stats, workers=dw_workers)
+
+    with session.transaction():
+        if seasons:
+            match_ids = {r[0] for r in session.con.execute(f"""
+                SELECT match_id FROM {matches}
+                UNION
+                SELECT match_id FROM fact_match WHERE season IN (SELECT UNNEST(?::VARCHAR[]))
+            """, [seasons]).fetchall()}
+            logging.info("Backfilling seasons %s from silver (%d matches)", seasons, len(match_ids))
+            previous_keys = touched_keys(session, match_ids)
+            previous_cells = cube_keys(session.con, match_ids)
+            with stage(session, "dw", rows_in=len(match_ids), tables=DW_TABLES):
+                update_dw(session, match_ids, matches, stats)
+            with stage(session, "kpis", tables=KPI_TABLES):
+                build_kpis(session)
+            with stage(session, "cube", tables=CUBE_TABLES):
+                update_cube(session, match_ids, previous_cells)
+            with stage(session, "views", tables=VIEW_TABLES):
+                refresh_business_views(session, match_ids, previous_keys)
+            return
+
+        if dw_workers <= 1:
+            with stage(session, "dw", tables=DW_TABLES):
+                build_dw(session, matches, stats)
+        with stage(session, "kpis", tables=KPI_TABLES):
+            build_kpis(session)
+        with stage(session, "cube", tables=CUBE_TABLES):
+            build_cube(session)
+        with stage(session, "views", tables=VIEW_TABLES):
+            build_business_views(session)
+
+# threads/memory_limit configure the single DuckDB session shared by all stages.
+def main(
+    incremental: bool = False,
+    chunksize: int | None = None,
+    engine: str = "pandas",
+    from_silver: bool = False,
+    seasons: list[str] | None = None,
+    threads: int | None = None,
+    memory_limit: str | None = None,
+    dw_workers: int = 1,
+    materialized_views: bool = False,
+    compact: bool = False,
+    use_cache: bool = True,
+    matches_src: str | Path = MATCHES_CSV,
+    stats_src: str | Path = STATS_CSV,
+    ingest_workers: int = 1,
+    shard_workers: int = 0,
+    fact_indexes: bool = False,
+    recluster: bool = False,
+) -> None:
+    setup_logging(BASE_DIR)
+    logging.info("START pipeline")
+    bronze = resolve_bronze(matches_src, stats_src, ingest_workers)
+    logging.info("Bronze sources: %d matches file(s), %d player stats file(s)",
+                 len(bronze.matches), len(bronze.stats))
+
+    with Session(DB_PATH, threads=threads, memory_limit=memory_limit) as session:
+        # The mode is kept in the database, later runs refresh the materialised views
+        if materialized_views:
+            materialize_views(session)
+        run(session, incremental, chunksize, engine, from_silver, seasons, dw_workers, compact,
+            use_cache, bronze, shard_workers)
+        # Physical layout of the facts (see dw.FACT_CLUSTER_KEYS); the indexes
+        # are kept by later runs
+        if recluster:
+            cluster_facts(session)
+        if fact_indexes:
+            index_facts(session)
+        record_table_sizes(session)
 
     logging.info("DONE pipeline. DuckDB at %s", DB_PATH)
 
+def run(
+    session: Session,
+    incremental: bool,
+    chunksize: int | None,
+    engine: str,
+    from_silver: bool,
+    seasons: list[str] | None,
+    dw_workers: int = 1,
+    compact: bool = False,
+    use_cache: bool = True,
+    bronze: Bronze = DEFAULT_BRONZE,
+    shard_workers: int = 0,
+) -> None:
+    # from_silver takes precedence, then incremental, then chunksize;
+    # engine selects the silver engine of full runs.
+    # The first incremental run has nothing to merge into, so it does a full load
+    # Full runs skip the stages whose inputs and code did not change (stage_cache)
+    cache = StageCache(session) if use_cache else None
+    if from_silver:
+        run_from_silver(session, seasons, dw_workers)
+    elif incremental and session.table_exists("stg_matches", "stg_player_stats"):
+        run_incremental(session, compact, bronze)
+    elif chunksize:
+        run_streaming(session, chunksize, dw_workers, cache, bronze)
+    else:
+        run_full(session, engine, dw_workers, compact, cache, bronze, shard_workers)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Football data pipeline")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="load only new or changed matches using the stored watermarks",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=None,
+        help="stream the bronze files in chunks of this many rows (bounded memory)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="pandas",
+        help="silver engine for full runs: pandas, or duckdb (Arrow CSV streams + SQL)",
+    )
+    parser.add_argument(
+        "--from-silver",
+        action="store_true",
+        help="rebuild gold from the Parquet silver layer instead of the bronze CSVs",
+    )
+    parser.add_argument(
+        "--season",
+        action="append",
+        dest="seasons",
+        help="with --from-silver, only backfill this season (repeatable)",
+    )
+    parser.add_argument("--threads", type=int, default=None, help="DuckDB worker threads")
+    parser.add_argument("--memory-limit", default=None, help="DuckDB memory limit, e.g. 4GB")
+    parser.add_argument(
+        "--dw-workers",
+        type=int,
+        default=1,
+        help="build the warehouse into shadow tables on this many threads and swap them in (not faster, see README)",
+    )
+    parser.add_argument(
+        "--materialize-views",
+        action="store_true",
+        help="store the business views as tables, refreshed incrementally by later runs",
+    )
+    parser.add_argument(
+        "--compact-dtypes",
+        action="store_true",
+        help="pandas engine: categoricals, small nullable ints and Arrow strings in silver",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="rerun every stage even if its inputs and code are unchanged",
+    )
+    parser.add_argument(
+        "--matches",
+        default=MATCHES_CSV,
+        help="matches bronze source: CSV / CSV.gz file, directory or glob",
+    )
+    parser.add_argument(
+        "--stats",
+        default=STATS_CSV,
+        help="player stats bronze source: CSV / CSV.gz file, directory or glob",
+    )
+    parser.add_argument(
+        "--ingest-workers",
+        type=int,
+        default=1,
+        help="parse the files of a multi-file bronze source in this many processes",
+    )
+    parser.add_argument(
+        "--shard-workers",
+        type=int,
+        default=0,
+        help="pandas full runs: transform season/league shards in this many balanced batches, one process each",
+    )
+    parser.add_argument(
+        "--fact-indexes",
+        action="store_true",
+        help="add ART indexes for match and player lookups on the facts, kept by later runs",
+    )
+    parser.add_argument(
+        "--recluster",
+        action="store_true",
+        help="rewrite the facts in cluster order after the run (e.g. after incremental runs)",
+    )
+    args = parser.parse_args()
+    main(
+        incremental=args.incremental,
+        chunksize=args.chunksize,
+        engine=args.engine,
+        from_silver=args.from_silver,
+        seasons=args.seasons,
+        threads=args.threads,
+        memory_limit=args.memory_limit,
+        dw_workers=args.dw_workers,
+        materialized_views=args.materialize_views,
+        compact=args.compact_dtypes,
+        use_cache=not args.no_cache,
+        matches_src=args.matches,
+        stats_src=args.stats,
+        ingest_workers=args.ingest_workers,
+        shard_workers=args.shard_workers,
+        fact_indexes=args.fact_indexes,
+        recluster=args.recluster,
+    )
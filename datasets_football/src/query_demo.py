@@ -1,39 +1,48 @@
 from __future__ import annotations
 from pathlib import Path
-import duckdb
+from query_service import QueryService
 
 # Resolve project base directory and DuckDB database path
 BASE_DIR = Path(__file__).resolve().parents[1]
 DB_PATH = BASE_DIR / "data" / "gold" / "football_dw.duckdb"
 
 def main() -> None:
-    con = duckdb.connect(str(DB_PATH))
-
-    # Display aggregated KPIs
-    print("\nGOLD KPIs")
-    print(con.execute("SELECT * FROM gold_kpis ORDER BY kpi").df())
-
-    # Show top players by average rating
-    print("\nTOP PLAYERS BY RATING")
-    print(con.execute("SELECT * FROM vw_top_players_rating LIMIT 10").df())
-
-    # Compare goals scored vs expected goals (xG) by team
-    print("\nTEAMS: GOALS VS xG")
-    print(con.execute("SELECT * FROM vw_team_goals_vs_xg LIMIT 10").df())
-
-    # Display league table based on points
-    print("\nLEAGUE TABLE (POINTS)")
-    print(con.execute("SELECT * FROM vw_league_table_points LIMIT 10").df())
-
-    # Show match-level performance differentials
-    print("\nWIN DRIVERS (DELTAS)")
-    print(con.execute("SELECT * FROM vw_win_drivers_deltas LIMIT 10").df())
-
-    # Display defensive intensity metrics by team
-    print("\nDEFENSIVE INTENSITY BY TEAM")
-    print(con.execute("SELECT * FROM vw_team_defensive_intensity LIMIT 10").df())
-
-    con.close()
+    # Named queries of the read-only query service (pooled connections, cached results)
+    with QueryService(DB_PATH) as service:
+        # Display aggregated KPIs
+        print("\nGOLD KPIs")
+        print(service.query("kpis").df())
+
+        # Show top players by average rating
+        print("\nTOP PLAYERS BY RATING")
+        print(service.query("top_players").df())
+
+        # Compare goals scored vs expected goals (xG) by team
+        print("\nTEAMS: GOALS VS xG")
+        print(service.query("team_goals_vs_xg").df())
+
+        # Display league table based on points
+        print("\nLEAGUE TABLE 2024-25 (POINTS)")
+        print(service.query("league_table", season="2024-25").df().head(10))
+
+        # Show match-level performance differentials
+        print("\nWIN DRIVERS (DELTAS)")
+        print(service.query("win_drivers").df())
+
+        # Display defensive intensity metrics by team
+        print("\nDEFENSIVE INTENSITY BY TEAM")
+        print(service.query("defensive_intensity").df())
+
+        # Slice of the team cube: points and xG per team in one league/season
+        print("\nLALIGA 2024-25 BY TEAM (CUBE)")
+        print(service.slice(
+            ["matches", "points", "goals_for", "xg_for", "avg_possession_pct"],
+            by=["team"], filters={"league": "LaLiga", "season": "2024-25"},
+        ).df())
+
+        # Arrow result for data-science consumers (no pandas conversion)
+        print("\nTOP GOALKEEPERS (ARROW)")
+        print(service.arrow("top_players", position="GK", max_rows=5))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
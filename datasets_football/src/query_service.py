@@ -0,0 +1,455 @@
+from __future__ import annotations
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterator, Sequence
+from contextlib import contextmanager
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import TYPE_CHECKING
+from urllib.parse import parse_qs, urlparse
+import duckdb
+import pandas as pd
+from cube import plan_slice
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+# Read-only query API over the gold layer.
+# Analysts call a fixed set of named, parameterised queries (Python API or
+# local HTTP endpoint). Connections come from a small pool of read-only
+# DuckDB connections and results are kept in an LRU cache keyed by query and
+# parameters. The cache is dropped whenever the database file changes, i.e.
+# when a pipeline run completes.
+BASE_DIR = Path(__file__).resolve().parents[1]
+DB_PATH = BASE_DIR / "data" / "gold" / "football_dw.duckdb"
+
+@dataclass(frozen=True)
+class QueryParam:
+    name: str
+    type: type = str
+    # Optional parameters default to this value (NULL: no filter)
+    default: object = None
+    required: bool = False
+    # Allowed values, when restricted (e.g. a column to rank by)
+    choices: tuple[str, ...] = ()
+
+@dataclass(frozen=True)
+class NamedQuery:
+    sql: str
+    params: tuple[QueryParam, ...] = ()
+
+LIMIT = QueryParam("max_rows", int, default=10)
+
+# Columns of agg_player_season a player leaderboard can rank by
+LEADERBOARD_METRICS = (
+    "avg_rating", "goals", "assists", "minutes",
+    "goals_per_90", "assists_per_90", "shots_per_90", "passes_per_90",
+    "tackles_per_90", "interceptions_per_90",
+)
+LEADERBOARD_ORDER = "CASE $metric " + " ".join(
+    f"WHEN '{m}' THEN {m}::DOUBLE" for m in LEADERBOARD_METRICS
+) + " END"
+
+# Queries use DuckDB named parameters ($name); NULL filters match everything.
+QUERIES = {
+    "kpis": NamedQuery("SELECT kpi, value FROM gold_kpis ORDER BY kpi"),
+    # Standings of one season (optionally one league) at the end of the data,
+    # on a date (as_of) or after each team's n-th match (matchday): the latest
+    # row of every team in fact_team_match
+    "league_table": NamedQuery(
+        """
+        SELECT
+            s.league,
+            t.team_name,
+            s.matchday AS matches,
+            s.cum_points AS points,
+            s.cum_goals_for AS goals_for,
+            s.cum_goals_against AS goals_against,
+            s.cum_goal_diff AS goal_diff,
+            s.form_last5 AS form
+        FROM fact_team_match s
+        JOIN dim_team t ON t.team_sk = s.team_sk
+        WHERE s.season = $season
+          AND ($league::VARCHAR IS NULL OR s.league = $league)
+          AND ($as_of::TIMESTAMP IS NULL OR s.match_date <= $as_of::TIMESTAMP)
+          AND ($matchday::BIGINT IS NULL OR s.matchday <= $matchday)
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY s.league, s.team_sk ORDER BY s.matchday DESC) = 1
+        ORDER BY s.league, points DESC, goal_diff DESC, goals_for DESC
+        """,
+        (QueryParam("season", required=True), QueryParam("league"),
+         QueryParam("as_of"), QueryParam("matchday", int)),
+    ),
+    "top_players": NamedQuery(
+        """
+        SELECT * FROM vw_top_players_rating
+        WHERE $position::VARCHAR IS NULL OR position = $position
+        LIMIT $max_rows
+        """,
+        (QueryParam("position"), LIMIT),
+    ),
+    # Players of a season ranked by a season aggregate (see dw.agg_player_season);
+    # min_minutes leaves out players whose per-90 rates rest on a few minutes
+    "player_leaderboard": NamedQuery(
+        f"""
+        SELECT
+            a.league,
+            a.player_name,
+            a.position,
+            a.team_name,
+            a.matches,
+            a.minutes,
+            {LEADERBOARD_ORDER} AS value
+        FROM agg_player_season a
+        WHERE a.season = $season
+          AND ($league::VARCHAR IS NULL OR a.league = $league)
+          AND ($position::VARCHAR IS NULL OR a.position = $position)
+          AND a.minutes >= $min_minutes
+        ORDER BY value DESC NULLS LAST, a.player_name
+        LIMIT $max_rows
+        """,
+        (QueryParam("season", required=True), QueryParam("league"), QueryParam("position"),
+         QueryParam("metric", default="avg_rating", choices=LEADERBOARD_METRICS),
+         QueryParam("min_minutes", int, default=270), LIMIT),
+    ),
+    "team_goals_vs_xg": NamedQuery("SELECT * FROM vw_team_goals_vs_xg LIMIT $max_rows", (LIMIT,)),
+    "win_drivers": NamedQuery("SELECT * FROM vw_win_drivers_deltas LIMIT $max_rows", (LIMIT,)),
+    "defensive_intensity": NamedQuery(
+        "SELECT * FROM vw_team_defensive_intensity LIMIT $max_rows", (LIMIT,)
+    ),
+}
+
+@dataclass(frozen=True)
+class QueryResult:
+    columns: tuple[str, ...]
+    rows: tuple[tuple, ...]
+
+    def df(self) -> pd.DataFrame:
+        return pd.DataFrame(list(self.rows), columns=list(self.columns))
+
+    def to_dict(self) -> dict:
+        return {"columns": list(self.columns), "rows": [list(r) for r in self.rows]}
+
+# Bind the given values to the parameters of a query: unknown names and
+# missing required parameters are errors, values are converted to the
+# declared type (HTTP parameters arrive as strings).
+def bind_params(query: NamedQuery, values: dict[str, object]) -> dict[str, object]:
+    unknown = set(values) - {p.name for p in query.params}
+    if unknown:
+        raise ValueError(f"Unknown parameters: {sorted(unknown)}")
+    bound = {}
+    for p in query.params:
+        value = values.get(p.name)
+        if value is None:
+            if p.required:
+                raise ValueError(f"Missing required parameter: {p.name}")
+            value = p.default
+        else:
+            value = p.type(value)
+        if p.choices and value not in p.choices:
+            raise ValueError(f"Invalid {p.name}: {value} (expected one of {p.choices})")
+        bound[p.name] = value
+    return bound
+
+# Pool of read-only connections (cursors of one read-only DuckDB connection,
+# each usable from its own thread).
+# A read-only handle blocks the pipeline from opening the database for
+# writing, so the connections are closed once the pool has been idle for
+# idle_seconds and reopened on the next query. reset() closes them after the
+# queries in flight, so the next query sees the latest database state.
+class ConnectionPool:
+    def __init__(self, db_path: Path, size: int = 4, idle_seconds: float = 2.0) -> None:
+        self.db_path = db_path
+        self.size = size
+        self.idle_seconds = idle_seconds
+        self._cond = threading.Condition()
+        self._base: duckdb.DuckDBPyConnection | None = None
+        self._free: list[duckdb.DuckDBPyConnection] = []
+        self._opened = 0
+        self._in_use = 0
+        self._last_used = 0.0
+        self._timer: threading.Timer | None = None
+
+    @contextmanager
+    def acquire(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        with self._cond:
+            while not self._free and self._opened >= self.size:
+                self._cond.wait()
+            if self._free:
+                con = self._free.pop()
+            else:
+                if self._base is None:
+                    self._base = duckdb.connect(str(self.db_path), read_only=True)
+                con = self._base.cursor()
+                self._opened += 1
+            self._in_use += 1
+        try:
+            yield con
+        finally:
+            with self._cond:
+                self._in_use -= 1
+                self._free.append(con)
+                self._last_used = time.monotonic()
+                self._cond.notify_all()
+                if self._in_use == 0:
+                    self._schedule_idle_close()
+
+    def reset(self) -> None:
+        with self._cond:
+            while self._in_use:
+                self._cond.wait()
+            self._close()
+
+    def close(self) -> None:
+        self.reset()
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def _schedule_idle_close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.idle_seconds, self._close_if_idle)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _close_if_idle(self) -> None:
+        with self._cond:
+            if self._in_use == 0 and time.monotonic() - self._last_used >= self.idle_seconds:
+                self._close()
+
+    # Caller holds the lock and no connection is in use
+    def _close(self) -> None:
+        for con in self._free:
+            con.close()
+        if self._base is not None:
+            self._base.close()
+        self._base = None
+        self._free = []
+        self._opened = 0
+        self._cond.notify_all()
+
+# LRU cache of query results (QueryResult or Arrow tables), safe to share
+# between threads
+class ResultCache:
+    def __init__(self, size: int = 256) -> None:
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._items: OrderedDict[tuple, object] = OrderedDict()
+
+    def get(self, key: tuple) -> object | None:
+        with self._lock:
+            result = self._items.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: tuple, result: object) -> None:
+        with self._lock:
+            self._items[key] = result
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._items), "hits": self.hits, "misses": self.misses}
+
+class QueryService:
+    def __init__(
+        self,
+        db_path: Path = DB_PATH,
+        pool_size: int = 4,
+        cache_size: int = 256,
+        idle_seconds: float = 2.0,
+    ) -> None:
+        self.db_path = db_path
+        self.pool = ConnectionPool(db_path, pool_size, idle_seconds)
+        self.cache = ResultCache(cache_size)
+        self._version_lock = threading.Lock()
+        self._version = self.db_version()
+
+    # Run a named query, from the cache when the same query and parameters
+    # were already answered since the last pipeline run.
+    def query(self, name: str, **params: object) -> QueryResult:
+        def fetch(cur: duckdb.DuckDBPyConnection) -> QueryResult:
+            return QueryResult(tuple(d[0] for d in cur.description), tuple(cur.fetchall()))
+        return self._cached("rows", name, params, fetch)
+
+    # Same as query, as an Arrow table built by DuckDB (no pandas or Python
+    # rows in between). Arrow tables are immutable, so cached ones are shared
+    # as they are. Requires pyarrow.
+    def arrow(self, name: str, **params: object) -> pa.Table:
+        return self._cached("arrow", name, params, lambda cur: cur.to_arrow_table())
+
+    # Slice of the team cube: metrics by dimensions with equality filters
+    # (see cube.plan_slice; answered from the facts when the cube cannot),
+    # cached like the named queries.
+    def slice(
+        self,
+        metrics: Sequence[str],
+        by: Sequence[str] = (),
+        filters: dict[str, object] | None = None,
+    ) -> QueryResult:
+        self.check_version()
+        key = ("slice", tuple(metrics), tuple(by), tuple(sorted(
+            (dim, tuple(v) if isinstance(v, (list, tuple, set)) else v)
+            for dim, v in (filters or {}).items()
+        )))
+        result = self.cache.get(key)
+        if result is None:
+            with self.pool.acquire() as con:
+                planned = plan_slice(con, metrics, by, filters)
+                cur = con.execute(planned.sql, planned.params)
+                result = QueryResult(tuple(d[0] for d in cur.description), tuple(cur.fetchall()))
+            self.cache.put(key, result)
+        return result
+
+    def _cached(
+        self,
+        kind: str,
+        name: str,
+        params: dict[str, object],
+        fetch: Callable[[duckdb.DuckDBPyConnection], object],
+    ) -> object:
+        if name not in QUERIES:
+            raise KeyError(f"Unknown query: {name}")
+        query = QUERIES[name]
+        bound = bind_params(query, params)
+        self.check_version()
+
+        key = (kind, name, tuple(sorted(bound.items())))
+        result = self.cache.get(key)
+        if result is None:
+            with self.pool.acquire() as con:
+                result = fetch(con.execute(query.sql, bound))
+            self.cache.put(key, result)
+        return result
+
+    # Database file state: a completed pipeline run changes the file (and
+    # checkpoints its write-ahead log), so this changes with every run.
+    def db_version(self) -> tuple:
+        version = []
+        for path in (self.db_path, self.db_path.with_name(self.db_path.name + ".wal")):
+            if path.exists():
+                st = path.stat()
+                version.append((path.name, st.st_mtime_ns, st.st_size))
+        return tuple(version)
+
+    def check_version(self) -> None:
+        version = self.db_version()
+        if version == self._version:
+            return
+        with self._version_lock:
+            if version != self._version:
+                self.invalidate()
+                self._version = version
+
+    # Drop cached results and reconnect, e.g. after a pipeline run
+    def invalidate(self) -> None:
+        self.cache.clear()
+        self.pool.reset()
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def __enter__(self) -> QueryService:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+# HTTP endpoint:
+#   GET  /queries                       named queries and their parameters
+#   GET  /query/<name>?param=value...   result as {"columns": [...], "rows": [...]}
+#   GET  /slice?metrics=a,b&by=c,d&dim=value...
+#                                       team cube slice (repeat a filter for several values)
+#   GET  /stats                         cache entries, hits and misses
+#   POST /invalidate                    drop cached results
+def make_handler(service: QueryService) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            if url.path == "/queries":
+                self._send(200, {
+                    name: [{"name": p.name, "type": p.type.__name__, "required": p.required,
+                            "default": p.default, **({"choices": list(p.choices)} if p.choices else {})}
+                           for p in q.params]
+                    for name, q in QUERIES.items()
+                })
+            elif url.path == "/stats":
+                self._send(200, service.cache.stats())
+            elif url.path.startswith("/query/"):
+                name = url.path.removeprefix("/query/")
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                try:
+                    self._send(200, service.query(name, **params).to_dict())
+                except KeyError as e:
+                    self._send(404, {"error": str(e.args[0])})
+                except ValueError as e:
+                    self._send(400, {"error": str(e)})
+                except duckdb.Error as e:
+                    self._send(500, {"error": str(e)})
+            elif url.path == "/slice":
+                params = parse_qs(url.query)
+                metrics = params.pop("metrics", [""])[-1].split(",")
+                by = [d for d in params.pop("by", [""])[-1].split(",") if d]
+                filters = {k: v if len(v) > 1 else v[0] for k, v in params.items()}
+                try:
+                    self._send(200, service.slice(metrics, by, filters).to_dict())
+                except ValueError as e:
+                    self._send(400, {"error": str(e)})
+                except duckdb.Error as e:
+                    self._send(500, {"error": str(e)})
+            else:
+                self._send(404, {"error": f"Unknown path: {url.path}"})
+
+        def do_POST(self) -> None:
+            if urlparse(self.path).path == "/invalidate":
+                service.invalidate()
+                self._send(200, {"invalidated": True})
+            else:
+                self._send(404, {"error": f"Unknown path: {self.path}"})
+
+        def _send(self, status: int, body: object) -> None:
+            data = json.dumps(body, default=str).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+def serve(service: QueryService, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    return ThreadingHTTPServer((host, port), make_handler(service))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read-only query service over the gold layer")
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pool-size", type=int, default=4, help="read-only DuckDB connections")
+    parser.add_argument("--cache-size", type=int, default=256, help="cached query results")
+    args = parser.parse_args()
+
+    with QueryService(args.db, args.pool_size, args.cache_size) as service:
+        server = serve(service, args.host, args.port)
+        print(f"Serving {args.db} on http://{args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
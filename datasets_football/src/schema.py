@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+# Provenance of every staged row: bronze file name and ingestion time
+# (see bronze.py).
+PROVENANCE_SCHEMA = {
+    "source_file": "VARCHAR",
+    "ingested_at": "TIMESTAMP",
+}
+
+# Declared DuckDB types of the staging (silver) tables.
+# Both silver engines (pandas and DuckDB SQL) load into exactly these types,
+# so stg_* tables do not depend on what pandas happened to infer from a file.
+STG_MATCHES_SCHEMA = {
+    "match_id": "VARCHAR",
+    "season": "VARCHAR",
+    "league": "VARCHAR",
+    "date": "TIMESTAMP",
+    "stadium": "VARCHAR",
+    "home_team": "VARCHAR",
+    "away_team": "VARCHAR",
+    "home_goals": "BIGINT",
+    "away_goals": "BIGINT",
+    "home_shots": "BIGINT",
+    "away_shots": "BIGINT",
+    "home_xG": "DOUBLE",
+    "away_xG": "DOUBLE",
+    "home_possession_pct": "BIGINT",
+    "away_possession_pct": "BIGINT",
+    "attendance": "BIGINT",
+    "referee": "VARCHAR",
+    **PROVENANCE_SCHEMA,
+}
+
+STG_PLAYER_STATS_SCHEMA = {
+    "match_id": "VARCHAR",
+    "team": "VARCHAR",
+    "player_id": "VARCHAR",
+    "player_name": "VARCHAR",
+    "position": "VARCHAR",
+    "minutes": "BIGINT",
+    "shots": "BIGINT",
+    "goals": "BIGINT",
+    "assists": "BIGINT",
+    "passes": "BIGINT",
+    "pass_accuracy_pct": "BIGINT",
+    "tackles": "BIGINT",
+    "interceptions": "BIGINT",
+    "fouls_committed": "BIGINT",
+    "card": "VARCHAR",
+    "rating": "DOUBLE",
+    **PROVENANCE_SCHEMA,
+}
+
+# pandas dtypes matching the declared types, for parsing at read time
+# (TIMESTAMP columns are returned separately, for read_csv's parse_dates).
+PANDAS_DTYPES = {"VARCHAR": "string", "BIGINT": "Int64", "DOUBLE": "float64"}
+
+def pandas_dtypes(schema: dict[str, str]) -> tuple[dict[str, str], list[str]]:
+    dtypes = {col: PANDAS_DTYPES[t] for col, t in schema.items() if t in PANDAS_DTYPES}
+    dates = [col for col, t in schema.items() if t == "TIMESTAMP"]
+    return dtypes, dates
+
+# SELECT list casting the given columns to their declared type.
+# Columns unknown to the schema are passed through unchanged.
+def typed_select(columns: list[str], schema: dict[str, str]) -> str:
+    parts = []
+    for col in columns:
+        if col in schema:
+            parts.append(f'CAST("{col}" AS {schema[col]}) AS "{col}"')
+        else:
+            parts.append(f'"{col}"')
+    return ", ".join(parts)
@@ -0,0 +1,78 @@
+from __future__ import annotations
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from uuid import uuid4
+import duckdb
+
+# One DuckDB connection shared by all pipeline stages.
+# The database file is opened once per run, so DuckDB's buffer cache and
+# catalog survive between stages, and several stages can be grouped in a
+# single transaction with transaction().
+# run_id identifies the pipeline run the session belongs to.
+class Session:
+    def __init__(
+        self,
+        db_path: Path,
+        threads: int | None = None,
+        memory_limit: str | None = None,
+        read_only: bool = False,
+    ) -> None:
+        if not read_only:
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        config = {}
+        if threads:
+            config["threads"] = threads
+        if memory_limit:
+            config["memory_limit"] = memory_limit
+
+        self.db_path = db_path
+        self.con = duckdb.connect(str(db_path), read_only=read_only, config=config)
+        self.run_id = uuid4().hex
+        self._depth = 0
+
+    # Transaction scope. Nested calls join the outermost transaction, so a
+    # stage that is atomic on its own (e.g. update_dw) can also run inside a
+    # larger unit of work such as the whole gold build.
+    @contextmanager
+    def transaction(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        if self._depth == 0:
+            self.con.execute("BEGIN TRANSACTION")
+        self._depth += 1
+        try:
+            yield self.con
+        except BaseException:
+            self._depth -= 1
+            if self._depth == 0:
+                self.con.execute("ROLLBACK")
+            raise
+        self._depth -= 1
+        if self._depth == 0:
+            self.con.execute("COMMIT")
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._depth > 0
+
+    def table_exists(self, *tables: str) -> bool:
+        return table_exists(self.con, *tables)
+
+    def close(self) -> None:
+        self.con.close()
+
+    def __enter__(self) -> Session:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+# Whether all the given tables exist (Session.table_exists for code that
+# is only given a connection).
+def table_exists(con: duckdb.DuckDBPyConnection, *tables: str) -> bool:
+    found = con.execute(
+        "SELECT COUNT(DISTINCT table_name) FROM information_schema.tables "
+        "WHERE table_name IN (SELECT UNNEST(?::VARCHAR[]))",
+        [list(tables)],
+    ).fetchone()[0]
+    return found == len(tables)
@@ -0,0 +1,145 @@
+from __future__ import annotations
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from session import Session
+from bronze import Bronze, read_bronze
+from extract import extract_matches, extract_player_stats
+from transform import transform, transform_matches
+from data_quality import check_staging
+from schema import STG_MATCHES_SCHEMA, STG_PLAYER_STATS_SCHEMA, typed_select
+
+# Sharded silver step for large backfills.
+# The bronze files are parsed once, and their rows split into shards by the
+# season and league of each match (player rows follow their match). The
+# shards are packed into one batch per worker, balanced by row count; every
+# batch is transformed and written to Parquet by its own process, over one
+# DuckDB connection, and the batches are merged into the staging tables.
+# The data quality rules run once, on the merged tables (uniqueness,
+# foreign keys and non-empty datasets span shards), so a run fails exactly
+# when a single-process run would, and otherwise stages the same rows (in
+# batch order).
+# Only the shard keys are cleaned before the split. An unparsed date column
+# is parsed there too: pandas infers its format from the first value, which
+# has to be that of the whole file, not of a batch.
+
+# Transform one batch of raw rows and write it to Parquet with the silver
+# types; returns its Parquet files.
+def process_batch(
+    name: str,
+    matches_raw: pd.DataFrame,
+    stats_raw: pd.DataFrame,
+    out_dir: Path,
+    compact: bool = False,
+) -> tuple[Path, Path]:
+    matches, stats = transform(matches_raw, stats_raw, compact)
+
+    # Registered as Arrow tables: DuckDB scans the Arrow-backed strings in
+    # place instead of converting them to Python objects
+    con = duckdb.connect()
+    paths = out_dir / f"{name}.matches.parquet", out_dir / f"{name}.player_stats.parquet"
+    for df, schema, path in ((matches, STG_MATCHES_SCHEMA, paths[0]), (stats, STG_PLAYER_STATS_SCHEMA, paths[1])):
+        con.register("batch_df", pa.Table.from_pandas(df, preserve_index=False))
+        con.execute(f"""
+            COPY (SELECT {typed_select(list(df.columns), schema)} FROM batch_df)
+            TO '{path.as_posix()}' (FORMAT parquet)
+        """)
+        con.unregister("batch_df")
+    con.close()
+    return paths
+
+# Shard of every match row (one per season/league) and of every player row
+# (that of its match). Player rows whose match_id matches no match get a
+# shard of their own (which fails the foreign key rule, as in a
+# single-process run).
+def shard_ids(matches_raw: pd.DataFrame, stats_raw: pd.DataFrame) -> tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+    raw_cols = {c.strip(): c for c in matches_raw.columns}
+    keys = transform_matches(matches_raw[[raw_cols[c] for c in ("match_id", "season", "league", "date") if c in raw_cols]])
+    if "date" in raw_cols:
+        matches_raw = matches_raw.assign(**{raw_cols["date"]: keys["date"]})
+
+    group_cols = [c for c in ("season", "league") if c in keys.columns]
+    match_shard = (
+        keys.groupby(group_cols, dropna=False, sort=False).ngroup().to_numpy()
+        if group_cols else np.zeros(len(keys), dtype=int)
+    )
+    orphan = match_shard.max() + 1 if len(match_shard) else 0
+
+    # Duplicated match ids (a DQ failure) keep their first shard; without a
+    # match_id column all player rows are orphans (and fail the required rule)
+    raw_stats_cols = {c.strip(): c for c in stats_raw.columns}
+    if "match_id" in keys.columns and "match_id" in raw_stats_cols:
+        shard_of = pd.Series(match_shard, index=keys["match_id"].to_numpy())
+        shard_of = shard_of[~shard_of.index.duplicated()]
+        stats_match_id = stats_raw[raw_stats_cols["match_id"]].astype("string").str.strip()
+        stats_shard = stats_match_id.map(shard_of).fillna(orphan).astype(int).to_numpy()
+    else:
+        stats_shard = np.full(len(stats_raw), orphan)
+    return matches_raw, match_shard, stats_shard
+
+# Pack the shards into at most n batches, balanced by row count: largest
+# shard first, each to the batch with the fewest rows so far. Returns the
+# batch of every shard.
+def pack_shards(shard_rows: np.ndarray, n: int) -> np.ndarray:
+    batch_of = np.zeros(len(shard_rows), dtype=int)
+    batch_rows = [0] * max(1, min(n, np.count_nonzero(shard_rows)))
+    for shard in np.argsort(-shard_rows, kind="stable"):
+        i = batch_rows.index(min(batch_rows))
+        batch_of[shard] = i
+        batch_rows[i] += shard_rows[shard]
+    return batch_of
+
+# Extract -> transform -> staging, sharded over workers processes, then the
+# data quality rules on the merged staging tables. With several bronze
+# files, the workers parse them too. Returns the number of shards.
+def load_staging_sharded(
+    bronze: Bronze,
+    session: Session,
+    workers: int = 2,
+    compact: bool = False,
+) -> int:
+    readers = max(workers, bronze.workers)
+    matches_raw = read_bronze(bronze.matches, extract_matches, readers)
+    stats_raw = read_bronze(bronze.stats, extract_player_stats, readers)
+    matches_raw, match_shard, stats_shard = shard_ids(matches_raw, stats_raw)
+
+    n_shards = max(match_shard.max(initial=-1), stats_shard.max(initial=-1)) + 1
+    shard_rows = np.bincount(match_shard, minlength=n_shards) + np.bincount(stats_shard, minlength=n_shards)
+    batch_of = pack_shards(shard_rows, workers)
+    match_batch, stats_batch = batch_of[match_shard], batch_of[stats_shard]
+    # No rows at all: one empty batch, so the merged tables fail the non-empty rules
+    batches = [
+        (matches_raw[match_batch == i], stats_raw[stats_batch == i])
+        for i in range(batch_of.max(initial=0) + 1)
+    ]
+    del matches_raw, stats_raw
+
+    with tempfile.TemporaryDirectory(prefix="shards-", dir=session.db_path.parent) as tmp:
+        out_dir = Path(tmp)
+        names = [f"batch{i:03d}" for i in range(len(batches))]
+        args = (names, [m for m, _ in batches], [s for _, s in batches], [out_dir] * len(batches), [compact] * len(batches))
+        if len(batches) > 1:
+            with ProcessPoolExecutor(max_workers=len(batches)) as pool:
+                paths = list(pool.map(process_batch, *args))
+        else:
+            paths = list(map(process_batch, *args))
+
+        _merge_staging(session, [m for m, _ in paths], [s for _, s in paths])
+    return n_shards
+
+# Replace the staging tables with the union of the batch files, and check
+# the merged tables (a failure rolls the staging tables back).
+def _merge_staging(session: Session, matches_files: list[Path], stats_files: list[Path]) -> None:
+    con = session.con
+    with session.transaction():
+        for table, files in (("stg_matches", matches_files), ("stg_player_stats", stats_files)):
+            paths = ", ".join(f"'{p.as_posix()}'" for p in files)
+            con.execute(f"""
+                CREATE OR REPLACE TABLE {table} AS
+                SELECT * FROM read_parquet([{paths}], union_by_name = true)
+            """)
+        check_staging(con)
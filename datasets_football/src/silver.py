@@ -0,0 +1,106 @@
+from __future__ import annotations
+import os
+import shutil
+from pathlib import Path
+from urllib.parse import quote
+from session import Session
+
+# Silver layer persisted as Parquet (zstd), hive-partitioned by season/league:
+#   <silver_dir>/matches/season=2024-25/league=LaLiga/data_0.parquet
+#   <silver_dir>/player_stats/season=2024-25/league=LaLiga/data_0.parquet
+# Player stats carry the season/league of their match so both datasets
+# prune on the same partition keys.
+PARTITION_COLS = ("season", "league")
+
+SILVER_SOURCES = {
+    "matches": "SELECT * FROM stg_matches",
+    "player_stats": """
+        SELECT s.*, m.season, m.league
+        FROM stg_player_stats s
+        JOIN stg_matches m ON m.match_id = s.match_id
+    """,
+}
+
+# Write the silver layer from the staging tables.
+# With seasons=None every partition is rewritten; otherwise only the
+# partitions of the given seasons are replaced and the rest are left as is.
+def write_silver(session: Session, silver_dir: Path, seasons: list[str] | None = None) -> None:
+    con = session.con
+
+    for dataset, query in SILVER_SOURCES.items():
+        target = silver_dir / dataset
+        if seasons is None:
+            shutil.rmtree(target, ignore_errors=True)
+            where = ""
+        else:
+            for season in seasons:
+                # Partition directory names are percent-encoded by DuckDB
+                shutil.rmtree(target / f"season={quote(season, safe='')}", ignore_errors=True)
+            where = f"WHERE season IN ({_sql_list(seasons)})"
+
+        target.mkdir(parents=True, exist_ok=True)
+        con.execute(f"""
+            COPY (SELECT * FROM ({query}) {where})
+            TO '{target.as_posix()}'
+            (FORMAT PARQUET, COMPRESSION ZSTD,
+             PARTITION_BY ({", ".join(PARTITION_COLS)}), OVERWRITE_OR_IGNORE true)
+        """)
+
+# Rewrite of the partitions of some seasons that follows a transaction: the
+# partitions are staged in a scratch directory next to the silver layer
+# (from the staging tables as the open transaction sees them), and only
+# moved into place by publish_silver once it has committed. After a rollback
+# discard_silver drops them and the silver layer is left as it was.
+def stage_silver(session: Session, silver_dir: Path, seasons: list[str]) -> None:
+    scratch = _scratch_dir(silver_dir)
+    shutil.rmtree(scratch, ignore_errors=True)
+    write_silver(session, scratch, seasons)
+
+def publish_silver(silver_dir: Path, seasons: list[str]) -> None:
+    scratch = _scratch_dir(silver_dir)
+    for dataset in SILVER_SOURCES:
+        for season in seasons:
+            # Partition directory names are percent-encoded by DuckDB
+            partition = f"season={quote(season, safe='')}"
+            shutil.rmtree(silver_dir / dataset / partition, ignore_errors=True)
+            if (scratch / dataset / partition).exists():
+                (silver_dir / dataset).mkdir(parents=True, exist_ok=True)
+                os.replace(scratch / dataset / partition, silver_dir / dataset / partition)
+    discard_silver(silver_dir)
+
+def discard_silver(silver_dir: Path) -> None:
+    shutil.rmtree(_scratch_dir(silver_dir), ignore_errors=True)
+
+def _scratch_dir(silver_dir: Path) -> Path:
+    return silver_dir.with_name(silver_dir.name + ".__next")
+
+# SQL relation reading one silver dataset. Filters on season/league are on
+# hive partition columns, so DuckDB only opens the matching directories.
+# player_stats is returned with the stg_player_stats columns only.
+def silver_relation(
+    silver_dir: Path,
+    dataset: str,
+    seasons: list[str] | None = None,
+    leagues: list[str] | None = None,
+) -> str:
+    path = (silver_dir / dataset).as_posix()
+    source = (
+        f"read_parquet('{path}/**/*.parquet', hive_partitioning = true, "
+        f"hive_types = {{'season': VARCHAR, 'league': VARCHAR}})"
+    )
+
+    filters = []
+    if seasons:
+        filters.append(f"season IN ({_sql_list(seasons)})")
+    if leagues:
+        filters.append(f"league IN ({_sql_list(leagues)})")
+    where = f"WHERE {' AND '.join(filters)}" if filters else ""
+
+    select = "* EXCLUDE (season, league)" if dataset == "player_stats" else "*"
+    return f"(SELECT {select} FROM {source} {where})"
+
+def silver_exists(silver_dir: Path) -> bool:
+    return all(any((silver_dir / d).glob("**/*.parquet")) for d in SILVER_SOURCES)
+
+def _sql_list(values: list[str]) -> str:
+    return ", ".join("'" + v.replace("'", "''") + "'" for v in values)
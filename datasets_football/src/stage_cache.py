@@ -0,0 +1,74 @@
+from __future__ import annotations
+import hashlib
+import json
+from pathlib import Path
+from session import Session
+
+# Stage-level cache of full runs.
+# A stage's key hashes its inputs and the source of the modules implementing
+# it; downstream stages also hash the key of the stage they read from, so a
+# change propagates down the chain (bronze -> silver -> dw -> kpis/cube/views)
+# while e.g. an edit to views.py only invalidates the views.
+# The keys of the last successful run are stored next to the DuckDB file.
+SRC_DIR = Path(__file__).resolve().parent
+
+STAGE_CODE = {
+    "silver": (
+        "bronze.py", "extract.py", "transform.py", "transform_sql.py", "streaming.py",
+        "sharding.py", "data_quality.py", "load.py", "schema.py", "silver.py",
+    ),
+    "dw": ("dw.py", "dag.py", "integrity.py"),
+    "kpis": ("kpis.py",),
+    "cube": ("cube.py",),
+    "views": ("views.py",),
+}
+
+# Stage -> the stage whose output it reads
+STAGE_UPSTREAM = {"dw": "silver", "kpis": "dw", "cube": "dw", "views": "dw"}
+
+def cache_path(db_path: Path) -> Path:
+    return db_path.with_name(db_path.stem + ".stage_cache.json")
+
+class StageCache:
+    def __init__(self, session: Session, path: Path | None = None) -> None:
+        self.session = session
+        self.path = path or cache_path(session.db_path)
+        self.stored = json.loads(self.path.read_text()) if self.path.exists() else {}
+        self.keys: dict[str, str] = {}
+
+    # Compute (and remember) the key of a stage for this run.
+    # inputs are extra strings identifying what the stage reads, e.g. the
+    # content hash of the bronze files.
+    def key(self, stage: str, *inputs: str) -> str:
+        h = hashlib.sha256(stage.encode())
+        upstream = STAGE_UPSTREAM.get(stage)
+        if upstream is not None:
+            h.update(self.keys[upstream].encode())
+        for part in inputs:
+            h.update(part.encode())
+        for name in STAGE_CODE[stage]:
+            h.update((SRC_DIR / name).read_bytes())
+        self.keys[stage] = h.hexdigest()
+        return self.keys[stage]
+
+    # A stage can be skipped when its key is the one stored by the last run
+    # and the tables it produces are still in the warehouse.
+    def fresh(self, stage: str, tables: tuple[str, ...] = ()) -> bool:
+        return (
+            stage in self.keys
+            and self.stored.get(stage) == self.keys[stage]
+            and (not tables or self.session.table_exists(*tables))
+        )
+
+    # Record stages as done (call after their work is committed)
+    def store(self, *stages: str) -> None:
+        for stage in stages:
+            self.stored[stage] = self.keys[stage]
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.stored, indent=2))
+        tmp.replace(self.path)
+
+# Forget every stored key, e.g. after a run mode that changes the warehouse
+# outside of the cache (incremental, from silver).
+def clear_cache(db_path: Path) -> None:
+    cache_path(db_path).unlink(missing_ok=True)
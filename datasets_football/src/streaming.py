@@ -0,0 +1,87 @@
+from __future__ import annotations
+from collections.abc import Callable, Iterator, Sequence
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+import pandas as pd
+import duckdb
+from session import Session
+from extract import iter_csv
+from bronze import iter_bronze
+from transform import transform_matches, transform_stats
+from schema import STG_MATCHES_SCHEMA, STG_PLAYER_STATS_SCHEMA, typed_select
+from data_quality import Rule, rules_of, validate
+
+# Streaming silver path for bronze files larger than RAM.
+# Each chunk is extracted, transformed, validated and appended to staging
+# before the next one is read, so peak memory is bounded by chunksize.
+# Chunk-safe rules (required columns, row rules, FK) run on every chunk;
+# uniqueness and non-emptiness run once on staging, inside DuckDB.
+# Matches are streamed first so stats chunks can be FK-checked against stg_matches.
+# On any failure the transaction is rolled back and staging is left untouched.
+# Each source may be several bronze files, streamed one after the other.
+# Returns the number of rows staged for matches and player stats.
+def stream_to_staging(
+    matches_files: Sequence[Path],
+    stats_files: Sequence[Path],
+    session: Session,
+    chunksize: int = 100_000,
+) -> tuple[int, int]:
+    con = session.con
+    ingested_at = datetime.now()
+
+    with session.transaction():
+        n_matches = _stream_table(
+            con, "matches", "stg_matches", STG_MATCHES_SCHEMA,
+            iter_bronze(matches_files, partial(iter_csv, schema=STG_MATCHES_SCHEMA), chunksize, ingested_at),
+            transform_matches,
+        )
+        validate(
+            con, {"matches": "stg_matches"}, _dataset_rules("matches", "non_empty", "unique")
+        ).raise_if_failed()
+
+        n_stats = _stream_table(
+            con, "player_stats", "stg_player_stats", STG_PLAYER_STATS_SCHEMA,
+            iter_bronze(stats_files, partial(iter_csv, schema=STG_PLAYER_STATS_SCHEMA), chunksize, ingested_at),
+            transform_stats,
+        )
+        validate(
+            con, {"player_stats": "stg_player_stats"}, _dataset_rules("player_stats", "non_empty")
+        ).raise_if_failed()
+    return n_matches, n_stats
+
+def _dataset_rules(dataset: str, *kinds: str) -> list[Rule]:
+    return [r for r in rules_of(*kinds) if r.dataset == dataset]
+
+def _stream_table(
+    con: duckdb.DuckDBPyConnection,
+    dataset: str,
+    table: str,
+    schema: dict[str, str],
+    chunks: Iterator[pd.DataFrame],
+    transform_chunk: Callable[[pd.DataFrame], pd.DataFrame],
+) -> int:
+    chunk_rules = _dataset_rules(dataset, "required", "row", "fk")
+    rows = 0
+    for i, raw in enumerate(chunks):
+        chunk = transform_chunk(raw)
+        del raw
+
+        # Parent keys for the FK rule are the matches already staged
+        con.register("chunk_df", chunk)
+        relations = {dataset: "chunk_df"}
+        if dataset != "matches":
+            relations["matches"] = "stg_matches"
+        validate(con, relations, chunk_rules).raise_if_failed()
+        # First chunk defines the staging table, later chunks are appended
+        if i == 0:
+            con.execute(f"""
+                CREATE OR REPLACE TABLE {table} AS
+                SELECT {typed_select(list(chunk.columns), schema)} FROM chunk_df
+            """)
+        else:
+            con.execute(f"INSERT INTO {table} BY NAME SELECT * FROM chunk_df")
+        con.unregister("chunk_df")
+
+        rows += len(chunk)
+    return rows
@@ -0,0 +1,140 @@
+from __future__ import annotations
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# Synthetic bronze files with the layout and value ranges of the real ones.
+# scale multiplies the row counts of the sample dataset (109 matches, 250
+# player rows); every player row belongs to a generated match and is played
+# by one of the two teams of that match.
+BASE_MATCHES = 109
+BASE_PLAYER_ROWS = 250
+
+LEAGUES = ["LaLiga", "Premier League", "Serie A", "Bundesliga", "Ligue 1"]
+TEAMS_PER_LEAGUE = 20
+MATCHES_PER_SEASON = TEAMS_PER_LEAGUE * (TEAMS_PER_LEAGUE - 1)
+SQUAD_SIZE = 25
+PLAYERS_PER_SIDE = 12
+POSITIONS = np.array(["GK", "DF", "MF", "FW"])
+# Squad slot -> position: 3 GK, 9 DF, 8 MF, 5 FW
+SQUAD_POSITIONS = np.repeat(np.arange(4), [3, 9, 8, 5])
+REFEREES = [f"Referee {i:02d}" for i in range(1, 21)]
+FIRST_NAMES = ["Alex", "Bruno", "Carlos", "Dani", "Eric", "Fran", "Gonzalo", "Hugo", "Ivan", "Javi"]
+LAST_NAMES = ["Garcia", "Lopez", "Martinez", "Sanchez", "Perez", "Gomez", "Diaz", "Ruiz", "Moreno", "Alonso"]
+
+# Matches are laid out league by league and season by season (double round
+# robin of 380 matches), seasons going back from 2024-25.
+def generate_matches(n: int, rng: np.random.Generator) -> pd.DataFrame:
+    idx = np.arange(n)
+    block = idx // MATCHES_PER_SEASON
+    league = block % len(LEAGUES)
+    season_start = 2024 - block // len(LEAGUES)
+    slot = idx % MATCHES_PER_SEASON
+
+    # Pair every team with every other team once at home
+    home = slot // (TEAMS_PER_LEAGUE - 1)
+    away = slot % (TEAMS_PER_LEAGUE - 1)
+    away = away + (away >= home)
+
+    dates = (
+        pd.to_datetime(season_start.astype(str) + "-08-15")
+        + pd.to_timedelta(rng.integers(0, 280, n), unit="D")
+    )
+
+    home_xg = rng.gamma(2.0, 0.75, n).round(2).clip(0.1, 4.5)
+    away_xg = rng.gamma(2.0, 0.65, n).round(2).clip(0.1, 4.5)
+    home_possession = rng.integers(30, 71, n)
+
+    return pd.DataFrame({
+        "match_id": [f"M{i:07d}" for i in idx + 1],
+        "season": [f"{y}-{(y + 1) % 100:02d}" for y in season_start],
+        "league": np.array(LEAGUES)[league],
+        "date": dates.strftime("%Y-%m-%d"),
+        "stadium": [f"Stadium {l}-{h:02d}" for l, h in zip(league, home)],
+        "home_team": _team_names(league, home),
+        "away_team": _team_names(league, away),
+        "home_goals": rng.poisson(home_xg),
+        "away_goals": rng.poisson(away_xg),
+        "home_shots": rng.integers(3, 24, n),
+        "away_shots": rng.integers(3, 19, n),
+        "home_xG": home_xg,
+        "away_xG": away_xg,
+        "home_possession_pct": home_possession,
+        "away_possession_pct": 100 - home_possession,
+        "attendance": rng.integers(8_000, 45_000, n),
+        "referee": rng.choice(REFEREES, n),
+    })
+
+# Player rows for the first matches, PLAYERS_PER_SIDE per team and match,
+# until n rows are produced. Squads are fixed per team, so a player keeps their
+# id, name and position across matches.
+def generate_player_stats(matches: pd.DataFrame, n: int, rng: np.random.Generator) -> pd.DataFrame:
+    per_match = 2 * PLAYERS_PER_SIDE
+    played = matches.iloc[: -(-n // per_match)]
+    league = played["league"].map({l: i for i, l in enumerate(LEAGUES)}).to_numpy()
+    home = played["home_team"].str.rsplit(" ", n=1).str[-1].astype(int).to_numpy() - 1
+    away = played["away_team"].str.rsplit(" ", n=1).str[-1].astype(int).to_numpy() - 1
+
+    # One row per (match, side, squad slot)
+    match_pos = np.repeat(np.arange(len(played)), per_match)
+    side = np.tile(np.repeat([0, 1], PLAYERS_PER_SIDE), len(played))
+    # Distinct squad slots per side: first columns of a random permutation
+    squad_slot = rng.random((2 * len(played), SQUAD_SIZE)).argsort(axis=1)[:, :PLAYERS_PER_SIDE].ravel()
+    team = np.where(side == 0, home[match_pos], away[match_pos])
+    team_league = league[match_pos]
+    player_num = (team_league * TEAMS_PER_LEAGUE + team) * SQUAD_SIZE + squad_slot + 1
+
+    rows = len(match_pos)
+    minutes = rng.integers(11, 91, rows)
+    passes = rng.integers(6, 80, rows)
+    card = rng.choice(np.array(["", "Yellow", "Red"], dtype=object), rows, p=[0.9, 0.085, 0.015])
+
+    stats = pd.DataFrame({
+        "match_id": played["match_id"].to_numpy()[match_pos],
+        "team": _team_names(team_league, team),
+        "player_id": [f"P{p:07d}" for p in player_num],
+        "player_name": [
+            f"{FIRST_NAMES[p % len(FIRST_NAMES)]} {LAST_NAMES[(p // len(FIRST_NAMES)) % len(LAST_NAMES)]}"
+            for p in player_num
+        ],
+        "position": POSITIONS[SQUAD_POSITIONS[squad_slot]],
+        "minutes": minutes,
+        "shots": rng.integers(0, 5, rows),
+        "goals": rng.binomial(1, 0.1, rows),
+        "assists": rng.binomial(1, 0.1, rows),
+        "passes": passes,
+        "pass_accuracy_pct": rng.integers(56, 99, rows),
+        "tackles": rng.integers(0, 4, rows),
+        "interceptions": rng.integers(0, 3, rows),
+        "fouls_committed": rng.integers(0, 3, rows),
+        "card": card,
+        "rating": rng.normal(6.6, 0.7, rows).round(2).clip(4.5, 9.5),
+    })
+    return stats.iloc[:n]
+
+def _team_names(league: np.ndarray, team: np.ndarray) -> list[str]:
+    return [f"{LEAGUES[l]} Team {t + 1:02d}" for l, t in zip(league, team)]
+
+# Write futbol_matches.csv / futbol_player_stats.csv for the given scale
+# into out_dir and return their paths.
+def generate(out_dir: Path, scale: float = 1, seed: int = 0) -> tuple[Path, Path]:
+    rng = np.random.default_rng(seed)
+    matches = generate_matches(max(1, round(BASE_MATCHES * scale)), rng)
+    stats = generate_player_stats(matches, round(BASE_PLAYER_ROWS * scale), rng)
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    matches_csv = out_dir / "futbol_matches.csv"
+    stats_csv = out_dir / "futbol_player_stats.csv"
+    matches.to_csv(matches_csv, index=False)
+    stats.to_csv(stats_csv, index=False)
+    return matches_csv, stats_csv
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic bronze files")
+    parser.add_argument("out_dir", type=Path, help="directory to write the CSV files to")
+    parser.add_argument("--scale", type=float, default=1, help="multiple of the sample dataset size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    m, s = generate(args.out_dir, args.scale, args.seed)
+    print(f"Wrote {m} and {s}")
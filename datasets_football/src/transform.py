@@ -1,57 +1,125 @@
 from __future__ import annotations
+import numpy as np
 import pandas as pd
 
+NUMERIC_COLS_MATCHES = [
+    "home_goals", "away_goals", "home_shots", "away_shots",
+    "home_xG", "away_xG", "home_possession_pct",
+    "away_possession_pct", "attendance",
+]
+
+NUMERIC_COLS_STATS = [
+    "minutes", "shots", "goals", "assists", "passes",
+    "pass_accuracy_pct", "tackles", "interceptions",
+    "fouls_committed", "rating",
+]
+
+STRING_COLS_MATCHES = ["home_team", "away_team", "stadium", "league", "season", "referee"]
+STRING_COLS_STATS = ["team", "player_id", "player_name", "position", "card", "match_id"]
+
+# Compact dtypes (compact=True): low-cardinality text as categoricals, the
+# remaining text as Arrow-backed strings and counts as small nullable ints.
+# xG and rating stay float64: the silver schema stores them as DOUBLE and a
+# float32 round trip would change their values (1.85 -> 1.8500000238).
+CATEGORY_COLS = {
+    "season", "league", "stadium", "home_team", "away_team", "referee", "team", "position", "card",
+    "source_file",
+}
+
+COMPACT_INT_COLS = {
+    "home_goals": "Int16", "away_goals": "Int16",
+    "home_shots": "Int16", "away_shots": "Int16",
+    "home_possession_pct": "Int16", "away_possession_pct": "Int16",
+    "attendance": "Int32",
+    "minutes": "Int16", "shots": "Int16", "goals": "Int16", "assists": "Int16",
+    "passes": "Int16", "pass_accuracy_pct": "Int16", "tackles": "Int16",
+    "interceptions": "Int16", "fouls_committed": "Int16",
+}
+
 # Clean and normalize raw datasets.
 # This step standardizes column names, parses dates and enforces data types.
 def transform(
     matches: pd.DataFrame,
-    stats: pd.DataFrame
+    stats: pd.DataFrame,
+    compact: bool = False,
 ) -> tuple[pd.DataFrame, pd.DataFrame]:
-    m = matches.copy()
-    s = stats.copy()
+    m, s = transform_matches(matches), transform_stats(stats)
+    if compact:
+        m, s = compact_dtypes(m), compact_dtypes(s)
+    return m, s
+
+# Clean the matches dataset (also applied chunk by chunk in streaming mode).
+# Columns already parsed into their type at read time (extract.read_typed)
+# are not converted again.
+def transform_matches(matches: pd.DataFrame) -> pd.DataFrame:
+    # Shallow copy: with copy-on-write, replacing columns below never touches
+    # the caller's frame and unchanged columns share its memory
+    m = matches.copy(deep=False)
 
     # Normalize column names
     m.columns = [c.strip() for c in m.columns]
-    s.columns = [c.strip() for c in s.columns]
 
     # Parse date column
-    if "date" in m.columns:
+    if "date" in m.columns and not pd.api.types.is_datetime64_any_dtype(m["date"]):
         m["date"] = pd.to_datetime(m["date"], errors="coerce")
 
-    # Numeric columns (only if present)
-    numeric_cols_matches = [
-        "home_goals", "away_goals", "home_shots", "away_shots",
-        "home_xG", "away_xG", "home_possession_pct",
-        "away_possession_pct", "attendance",
-    ]
+    # Convert numeric columns (only if present)
+    for col in NUMERIC_COLS_MATCHES:
+        if col in m.columns and not pd.api.types.is_numeric_dtype(m[col]):
+            m[col] = pd.to_numeric(m[col], errors="coerce")
 
-    # Convert numeric columns in matches
-    for col in numeric_cols_matches:
+    # Clean string columns (nullable string dtype: missing values stay NULL
+    # instead of becoming the literal 'nan')
+    for col in STRING_COLS_MATCHES:
         if col in m.columns:
-            m[col] = pd.to_numeric(m[col], errors="coerce")
+            m[col] = m[col].astype("string").str.strip()
 
-    numeric_cols_stats = [
-        "minutes", "shots", "goals", "assists", "passes",
-        "pass_accuracy_pct", "tackles", "interceptions",
-        "fouls_committed", "rating",
-    ]
-    for col in numeric_cols_stats:
-        if col in s.columns:
-            s[col] = pd.to_numeric(s[col], errors="coerce")
+    # Ensure match_id is string
+    if "match_id" in m.columns:
+        m["match_id"] = m["match_id"].astype("string").str.strip()
 
-    # Clean string columns
-    for col in ["home_team", "away_team", "stadium", "league", "season", "referee"]:
-        if col in m.columns:
-            m[col] = m[col].astype(str).str.strip()
+    return m
+
+# Clean the player statistics dataset (also applied chunk by chunk in streaming mode).
+def transform_stats(stats: pd.DataFrame) -> pd.DataFrame:
+    s = stats.copy(deep=False)
+
+    # Normalize column names
+    s.columns = [c.strip() for c in s.columns]
+
+    # Convert numeric columns (only if present)
+    for col in NUMERIC_COLS_STATS:
+        if col in s.columns and not pd.api.types.is_numeric_dtype(s[col]):
+            s[col] = pd.to_numeric(s[col], errors="coerce")
 
-    for col in ["team", "player_id", "player_name", "position", "card", "match_id"]:
+    # Clean string columns (match_id included, so it is a stripped string)
+    for col in STRING_COLS_STATS:
         if col in s.columns:
-            s[col] = s[col].astype(str).str.strip()
+            s[col] = s[col].astype("string").str.strip()
 
-    # Ensure match_id is string in both datasets
-    if "match_id" in m.columns:
-        m["match_id"] = m["match_id"].astype(str).str.strip()
-    if "match_id" in s.columns:
-        s["match_id"] = s["match_id"].astype(str).str.strip()
+    return s
+
+# Downcast a cleaned dataset to the compact dtypes (same values, less memory).
+# Integer columns are only narrowed when every value is integral and fits
+# the target type, otherwise they are left as they are.
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    out = {}
+    for col in df.columns:
+        series = df[col]
+        if col in CATEGORY_COLS:
+            series = series.astype("category")
+        elif col in COMPACT_INT_COLS and _fits_int(series, COMPACT_INT_COLS[col]):
+            series = series.astype(COMPACT_INT_COLS[col])
+        elif isinstance(series.dtype, pd.StringDtype):
+            series = series.astype("string[pyarrow]")
+        out[col] = series
+    return pd.DataFrame(out, index=df.index)
 
-    return m, s
\ No newline at end of file
+def _fits_int(series: pd.Series, dtype: str) -> bool:
+    values = series.dropna()
+    if values.empty:
+        return True
+    if not pd.api.types.is_numeric_dtype(values):
+        return False
+    info = np.iinfo(dtype.lower())
+    return bool((values % 1 == 0).all() and values.between(info.min, info.max).all())
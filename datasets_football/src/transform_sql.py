@@ -0,0 +1,127 @@
+from __future__ import annotations
+from collections.abc import Iterator, Sequence
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+import duckdb
+import pyarrow as pa
+import pyarrow.csv as pv
+from session import Session
+from extract import open_bronze, sniff_stream
+from schema import STG_MATCHES_SCHEMA, STG_PLAYER_STATS_SCHEMA
+from transform import (
+    NUMERIC_COLS_MATCHES,
+    NUMERIC_COLS_STATS,
+    STRING_COLS_MATCHES,
+    STRING_COLS_STATS,
+)
+from data_quality import check_staging
+
+# Markers pandas.read_csv treats as missing by default; passed to the Arrow
+# CSV reader so both engines agree on what is NULL.
+PANDAS_NA_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None",
+    "n/a", "nan", "null",
+]
+
+# Characters removed by Python's str.strip() on ASCII text
+STRIP_CHARS_SQL = "' ' || chr(9) || chr(10) || chr(11) || chr(12) || chr(13)"
+
+# DuckDB silver engine.
+# Reads the bronze CSVs as Arrow streams and applies the same cleaning as
+# transform.py (header trimming, string trimming, numeric and date parsing
+# with NULL on failure, match_id as trimmed string) in SQL, then runs the
+# data quality rules on the staging tables. Nothing goes through pandas.
+# Each source may be several bronze files (see bronze.py). Every file is
+# read once: decoded as extract does (extract.open_bronze), with the dialect
+# and header detected on the prefix of the same stream, and parsed by
+# pyarrow's streaming CSV reader into text columns that DuckDB scans as
+# they are produced.
+def load_staging_sql(
+    matches_files: Sequence[Path],
+    stats_files: Sequence[Path],
+    session: Session,
+) -> None:
+    con = session.con
+
+    with session.transaction():
+        with bronze_source(con, matches_files, "bronze_matches") as (source, raw_cols):
+            con.execute(f"""
+                CREATE OR REPLACE TABLE stg_matches AS
+                {silver_select(source, raw_cols, STG_MATCHES_SCHEMA,
+                               NUMERIC_COLS_MATCHES, STRING_COLS_MATCHES + ["match_id"], ["date"])}
+            """)
+        with bronze_source(con, stats_files, "bronze_stats") as (source, raw_cols):
+            con.execute(f"""
+                CREATE OR REPLACE TABLE stg_player_stats AS
+                {silver_select(source, raw_cols, STG_PLAYER_STATS_SCHEMA,
+                               NUMERIC_COLS_STATS, STRING_COLS_STATS, [])}
+            """)
+
+        # Validation failures roll the staging tables back
+        check_staging(con)
+
+# Column holding the name of the file each row was read from
+FILENAME_COL = "__bronze_file"
+
+# Register the files of a bronze source on con as Arrow streams of text
+# columns (NULL for the pandas missing-value markers), one view per file.
+# Yields the SQL relation of all their rows, with files of different
+# column orders aligned by name as pd.concat does, and its raw columns.
+# The streams can be scanned once.
+@contextmanager
+def bronze_source(
+    con: duckdb.DuckDBPyConnection,
+    files: Sequence[Path],
+    name: str,
+) -> Iterator[tuple[str, list[str]]]:
+    with ExitStack() as stack:
+        selects, raw_cols = [], []
+        for i, path in enumerate(files):
+            f = stack.enter_context(open_bronze(path))
+            fmt, header = sniff_stream(f)
+            reader = pv.open_csv(
+                f,
+                parse_options=pv.ParseOptions(delimiter=fmt.sep, quote_char=fmt.quotechar),
+                convert_options=pv.ConvertOptions(
+                    column_types={c: pa.string() for c in header},
+                    null_values=PANDAS_NA_VALUES,
+                    strings_can_be_null=True,
+                ),
+            )
+            view = f"{name}_{i}"
+            con.register(view, reader)
+            stack.callback(con.unregister, view)
+            file_name = path.name.replace("'", "''")
+            selects.append(f"SELECT *, '{file_name}' AS {FILENAME_COL} FROM {view}")
+            raw_cols += [c for c in header if c not in raw_cols]
+        yield f"({' UNION ALL BY NAME '.join(selects)})", raw_cols
+
+# Build the cleaning SELECT for a bronze source from its actual header, so
+# that (as in transform.py) columns are only converted when present.
+# The provenance columns come last, as in bronze.read_bronze.
+def silver_select(
+    source: str,
+    raw_cols: list[str],
+    schema: dict[str, str],
+    numeric_cols: list[str],
+    string_cols: list[str],
+    date_cols: list[str],
+) -> str:
+    parts = []
+    for raw in raw_cols:
+        col = raw.strip()
+        ref = f'"{raw}"'
+        if col in date_cols:
+            expr = f"TRY_CAST(TRIM({ref}, {STRIP_CHARS_SQL}) AS TIMESTAMP)"
+        elif col in numeric_cols:
+            expr = f"TRY_CAST(TRY_CAST(TRIM({ref}, {STRIP_CHARS_SQL}) AS DOUBLE) AS {schema.get(col, 'DOUBLE')})"
+        elif col in string_cols:
+            expr = f"TRIM({ref}, {STRIP_CHARS_SQL})"
+        else:
+            expr = ref
+        parts.append(f'{expr} AS "{col}"')
+    parts.append(f"{FILENAME_COL} AS source_file")
+    parts.append("NOW()::TIMESTAMP AS ingested_at")
+
+    return f"SELECT {', '.join(parts)} FROM {source}"
@@ -1,14 +1,31 @@
 from __future__ import annotations
-from pathlib import Path
-import duckdb
+from dataclasses import dataclass
+import pandas as pd
+from session import Session
 
-def build_business_views(db_path: Path) -> None:
-    # Connect to the DuckDB database to create analytical views
-    con = duckdb.connect(str(db_path))
+# Business view definition.
+# select aggregates the facts and contains a {scope} predicate restricting the
+# groups it computes: TRUE for a full build, or `scope_col IN (touched keys)`
+# for an incremental refresh. key is the output column identifying a group and
+# scope the kind of key it holds ("team", "player" or "match").
+@dataclass(frozen=True)
+class BusinessView:
+    name: str
+    select: str
+    key: str
+    scope: str
+    scope_col: str
+    order_by: str = ""
 
+    @property
+    def table(self) -> str:
+        return "mv_" + self.name.removeprefix("vw_")
+
+BUSINESS_VIEWS = [
     # 1) Top players by rating
-    con.execute("""
-        CREATE OR REPLACE VIEW vw_top_players_rating AS
+    BusinessView(
+        "vw_top_players_rating",
+        """
         SELECT
             player_id,
             player_name,
@@ -18,15 +35,18 @@ def build_business_views(db_path: Path) -> None:
             AVG(minutes) AS avg_minutes,
             AVG(rating) AS avg_rating
         FROM fact_player_match
-        WHERE rating IS NOT NULL AND minutes IS NOT NULL
+        WHERE rating IS NOT NULL AND minutes IS NOT NULL AND {scope}
         GROUP BY player_id, player_name, position, team_name
         HAVING COUNT(*) >= 1
-        ORDER BY avg_rating DESC, matches_played DESC
-    """)
+        """,
+        key="player_id", scope="player", scope_col="player_id",
+        order_by="avg_rating DESC, matches_played DESC",
+    ),
 
     # 2) Teams: goals vs xG
-    con.execute("""
-        CREATE OR REPLACE VIEW vw_team_goals_vs_xg AS
+    BusinessView(
+        "vw_team_goals_vs_xg",
+        """
         WITH team_match AS (
             SELECT
                 home_team_sk AS team_sk,
@@ -52,14 +72,18 @@ def build_business_views(db_path: Path) -> None:
             (AVG(goals) - AVG(xg)) AS goals_minus_xg
         FROM team_match tm
         JOIN dim_team t ON t.team_sk = tm.team_sk
+        WHERE {scope}
         GROUP BY t.team_name
         HAVING COUNT(*) >= 10
-        ORDER BY goals_minus_xg DESC, matches DESC
-    """)
+        """,
+        key="team_name", scope="team", scope_col="t.team_name",
+        order_by="goals_minus_xg DESC, matches DESC",
+    ),
 
     # 3) League table (points)
-    con.execute("""
-        CREATE OR REPLACE VIEW vw_league_table_points AS
+    BusinessView(
+        "vw_league_table_points",
+        """
         WITH home AS (
             SELECT
                 home_team_sk AS team_sk,
@@ -100,13 +124,17 @@ def build_business_views(db_path: Path) -> None:
             (SUM(gf) - SUM(ga)) AS goal_diff
         FROM allm a
         JOIN dim_team t ON t.team_sk = a.team_sk
+        WHERE {scope}
         GROUP BY t.team_name
-        ORDER BY points DESC, goal_diff DESC, goals_for DESC
-    """)
+        """,
+        key="team_name", scope="team", scope_col="t.team_name",
+        order_by="points DESC, goal_diff DESC, goals_for DESC",
+    ),
 
     # 4) Match deltas (potential win drivers)
-    con.execute("""
-        CREATE OR REPLACE VIEW vw_win_drivers_deltas AS
+    BusinessView(
+        "vw_win_drivers_deltas",
+        """
         SELECT
             fm.match_id,
             home_t.team_name || ' vs ' || away_t.team_name AS game,
@@ -122,11 +150,15 @@ def build_business_views(db_path: Path) -> None:
             AND fm.home_shots IS NOT NULL AND fm.away_shots IS NOT NULL
             AND fm.home_possession_pct IS NOT NULL AND fm.away_possession_pct IS NOT NULL
             AND fm.result IS NOT NULL
-    """)
+            AND {scope}
+        """,
+        key="match_id", scope="match", scope_col="fm.match_id",
+    ),
 
     # 5) Defensive intensity by team (tackles+interceptions per 90)
-    con.execute("""
-        CREATE OR REPLACE VIEW vw_team_defensive_intensity AS
+    BusinessView(
+        "vw_team_defensive_intensity",
+        """
         SELECT
             team_name,
             COUNT(*) AS player_match_rows,
@@ -135,9 +167,129 @@ def build_business_views(db_path: Path) -> None:
             (SUM(tackles + interceptions) / NULLIF(SUM(minutes), 0)) * 90.0 AS actions_per_90
         FROM fact_player_match
         WHERE tackles IS NOT NULL AND interceptions IS NOT NULL AND minutes IS NOT NULL
+          AND {scope}
         GROUP BY team_name
         HAVING SUM(minutes) > 0
-        ORDER BY actions_per_90 DESC
-    """)
+        """,
+        key="team_name", scope="team", scope_col="team_name",
+        order_by="actions_per_90 DESC",
+    ),
+]
+
+# Refresh metadata of the materialised views. Its presence switches the
+# business views to materialised mode (see materialize_views).
+VIEW_METADATA = "mv_refresh_metadata"
+
+def views_materialized(session: Session) -> bool:
+    return session.table_exists(VIEW_METADATA)
+
+# Switch between plain views (every query aggregates the facts) and
+# materialised views (vw_* read a pre-aggregated mv_* table). The mode is
+# stored in the database and applied by the next build_business_views.
+def materialize_views(session: Session, enabled: bool = True) -> None:
+    con = session.con
+    if enabled:
+        con.execute(f"""
+            CREATE TABLE IF NOT EXISTS {VIEW_METADATA}(
+                view_name VARCHAR PRIMARY KEY,
+                table_name VARCHAR,
+                refresh_mode VARCHAR,
+                refreshed_at TIMESTAMP,
+                row_count BIGINT,
+                refreshed_keys BIGINT
+            )
+        """)
+        return
+
+    with session.transaction():
+        for view in BUSINESS_VIEWS:
+            con.execute(f"DROP VIEW IF EXISTS {view.name}")
+            con.execute(f"DROP TABLE IF EXISTS {view.table}")
+        con.execute(f"DROP TABLE IF EXISTS {VIEW_METADATA}")
+
+def build_business_views(session: Session) -> None:
+    # Use the shared DuckDB connection to create analytical views
+    con = session.con
+    materialized = views_materialized(session)
+
+    with session.transaction():
+        for view in BUSINESS_VIEWS:
+            select = view.select.format(scope="TRUE")
+            order_by = f"ORDER BY {view.order_by}" if view.order_by else ""
+
+            if not materialized:
+                con.execute(f"CREATE OR REPLACE VIEW {view.name} AS {select} {order_by}")
+                continue
+
+            con.execute(f"CREATE OR REPLACE TABLE {view.table} AS {select}")
+            con.execute(f"CREATE OR REPLACE VIEW {view.name} AS SELECT * FROM {view.table} {order_by}")
+            _record_refresh(session, view, "full", None)
+
+# Keys (teams, players, matches) whose aggregates depend on the given matches.
+# Taken before and after an update of the facts, so groups a changed match
+# moved out of are refreshed too. Empty unless the views are materialised.
+def touched_keys(session: Session, match_ids: set[str]) -> pd.DataFrame:
+    if not views_materialized(session):
+        return pd.DataFrame({"scope": pd.Series(dtype="string"), "key": pd.Series(dtype="string")})
+
+    con = session.con
+    con.register("touched_ids_df", pd.DataFrame({"match_id": sorted(match_ids)}))
+    keys = con.execute("""
+        SELECT 'match' AS scope, match_id AS key FROM touched_ids_df
+        UNION
+        SELECT 'team', t.team_name
+        FROM fact_match fm
+        JOIN dim_team t ON t.team_sk IN (fm.home_team_sk, fm.away_team_sk)
+        WHERE fm.match_id IN (SELECT match_id FROM touched_ids_df)
+        UNION
+        SELECT 'team', team_name FROM fact_player_match
+        WHERE match_id IN (SELECT match_id FROM touched_ids_df)
+        UNION
+        SELECT 'player', player_id FROM fact_player_match
+        WHERE match_id IN (SELECT match_id FROM touched_ids_df)
+    """).df()
+    con.unregister("touched_ids_df")
+    return keys
+
+# Bring the business views up to date after the facts of match_ids changed.
+# Materialised views only recompute the groups touched by those matches
+# (previous: touched_keys() taken before the facts were updated); plain views
+# are simply re-created. Falls back to a full build when a materialised table
+# has never been built.
+def refresh_business_views(
+    session: Session,
+    match_ids: set[str],
+    previous: pd.DataFrame | None = None,
+) -> None:
+    if not views_materialized(session):
+        build_business_views(session)
+        return
+
+    con = session.con
+    built = {r[0] for r in con.execute(f"SELECT view_name FROM {VIEW_METADATA}").fetchall()}
+    if not all(view.name in built for view in BUSINESS_VIEWS):
+        build_business_views(session)
+        return
+
+    keys = touched_keys(session, match_ids)
+    if previous is not None:
+        keys = pd.concat([previous, keys]).drop_duplicates()
+    con.register("touched_keys_df", keys)
+
+    with session.transaction():
+        for view in BUSINESS_VIEWS:
+            touched = f"(SELECT key FROM touched_keys_df WHERE scope = '{view.scope}')"
+            con.execute(f"DELETE FROM {view.table} WHERE {view.key} IN {touched}")
+            con.execute(f"""
+                INSERT INTO {view.table}
+                {view.select.format(scope=f"{view.scope_col} IN {touched}")}
+            """)
+            _record_refresh(session, view, "incremental", int((keys["scope"] == view.scope).sum()))
+
+    con.unregister("touched_keys_df")
 
-    con.close()
\ No newline at end of file
+def _record_refresh(session: Session, view: BusinessView, mode: str, refreshed_keys: int | None) -> None:
+    session.con.execute(f"""
+        INSERT OR REPLACE INTO {VIEW_METADATA}
+        SELECT ?, ?, ?, NOW()::TIMESTAMP, (SELECT COUNT(*) FROM {view.table}), ?
+    """, [view.name, view.table, mode, refreshed_keys])
@@ -0,0 +1,6 @@
+from __future__ import annotations
+import sys
+from pathlib import Path
+
+# The pipeline modules import each other as top-level modules from src/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
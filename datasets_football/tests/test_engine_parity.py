@@ -0,0 +1,24 @@
+from __future__ import annotations
+import gzip
+from pathlib import Path
+from engine_parity import MATCHES_CSV, STATS_CSV, engine_diffs
+
+# Split a bronze CSV into a directory of parts: a plain file with a UTF-8
+# BOM and a gzip file using ';' as delimiter, keeping the original bytes
+# (including their mixed encodings) otherwise.
+def _split_bronze(src: Path, out_dir: Path) -> Path:
+    header, *rows = src.read_bytes().splitlines(keepends=True)
+    half = len(rows) // 2
+    out_dir.mkdir()
+    (out_dir / "part0.csv").write_bytes(b"\xef\xbb\xbf" + header + b"".join(rows[:half]))
+    with gzip.open(out_dir / "part1.csv.gz", "wb") as f:
+        f.write(b"".join(line.replace(b",", b";") for line in [header, *rows[half:]]))
+    return out_dir
+
+def test_engines_match_on_sample_bronze():
+    assert engine_diffs(MATCHES_CSV, STATS_CSV) == []
+
+def test_engines_match_on_split_bronze(tmp_path):
+    matches = _split_bronze(MATCHES_CSV, tmp_path / "matches")
+    stats = _split_bronze(STATS_CSV, tmp_path / "player_stats")
+    assert engine_diffs(matches, stats) == []